@@ -1,7 +1,9 @@
 import streamlit as st
 import tempfile
-import os
-import google.generativeai as genai
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from llm_client import get_client
 from moviepy import VideoFileClip
 import moviepy as mp
 from dotenv import load_dotenv
@@ -11,9 +13,6 @@ from datetime import datetime
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
 transcribe_prompt = '''
 Please transcribe the following audio and provide the transcription in JSON format. 
 The JSON should include each segment of text with its corresponding start and end timestamps. 
@@ -61,9 +60,9 @@ def transcribe_audio(audio_file_path):
     try:
         print("Transcribing started...")
         st.write("Transcribing audio...")
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        audio_file = genai.upload_file(path=audio_file_path)
-        response = model.generate_content(
+        client = get_client()
+        audio_file = client.upload_file(audio_file_path)
+        response = client.generate(
         [
             transcribe_prompt,
             audio_file
@@ -78,8 +77,7 @@ def transcribe_audio(audio_file_path):
 def generate_highlights(transcription):
     try:
         print("highlighting started...")
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        response = model.generate_content("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription)
+        response = get_client().generate("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription)
         highlight_response = response.text.strip()
         # print((type(highlight_response))) #-> list
         print(highlight_response)
@@ -1,7 +1,9 @@
 import streamlit as st
 import tempfile
-import os
-import google.generativeai as genai
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from llm_client import get_client
 from moviepy import VideoFileClip
 from moviepy import *
 import moviepy as mp
@@ -18,9 +20,6 @@ import cv2
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
 transcribe_prompt = '''
 Please transcribe the following audio and provide the transcription in JSON format. 
 The JSON should include each segment of text with its corresponding start and end timestamps. 
@@ -102,9 +101,9 @@ def transcribe_audio(audio_file_path):
     try:
         print("Transcribing started...")
         st.write("Transcribing audio...")
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        audio_file = genai.upload_file(path=audio_file_path)
-        response = model.generate_content(
+        client = get_client()
+        audio_file = client.upload_file(audio_file_path)
+        response = client.generate(
         [
             transcribe_prompt,
             audio_file
@@ -123,8 +122,7 @@ def generate_highlights(video_file, transcription):
         print("highlighting started...")
         video = mp.VideoFileClip(video_file)
         duration = str(video.duration)
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        response = model.generate_content("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription+"Also note that the start and end time should not exceed the total duration of video ="+duration+".If you only when it exceeds then take the middle 25 to 30s of the clip and put it as start and end time. Don't forget to do this.")
+        response = get_client().generate("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription+"Also note that the start and end time should not exceed the total duration of video ="+duration+".If you only when it exceeds then take the middle 25 to 30s of the clip and put it as start and end time. Don't forget to do this.")
         highlight_response = response.text.strip()
         # print((type(highlight_response))) #-> list
         print(highlight_response)
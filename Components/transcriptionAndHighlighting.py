@@ -1,16 +1,15 @@
 import streamlit as st
 import tempfile
-import os
-import google.generativeai as genai
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from llm_client import get_client
 from moviepy import VideoFileClip
 from dotenv import load_dotenv
 import json
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
 transcribe_prompt = '''
 Please transcribe the following audio and provide the transcription in JSON format. 
 The JSON should include each segment of text with its corresponding start and end timestamps. 
@@ -61,9 +60,9 @@ def extract_audio_from_video(video_file_path):
 def transcribe_audio(audio_file_path):
     try:
         st.write("Transcribing audio...")
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        audio_file = genai.upload_file(path=audio_file_path)
-        response = model.generate_content(
+        client = get_client()
+        audio_file = client.upload_file(audio_file_path)
+        response = client.generate(
         [
             transcribe_prompt,
             audio_file
@@ -77,8 +76,7 @@ def transcribe_audio(audio_file_path):
 
 def generate_highlights(transcription):
     try:
-        model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-        response = model.generate_content("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription)
+        response = get_client().generate("highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription)
         highlight_response = response.text.strip()
         print(highlight_response)
         print("Highlighting Completed✅")
@@ -1,20 +1,18 @@
 import streamlit as st
 import tempfile
-import os
-import google.generativeai as genai
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from llm_client import get_client
 from moviepy import VideoFileClip
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure Google API key
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
 def transcribe_audio(audio_file_path):
-    model = genai.GenerativeModel("models/gemini-1.5-pro-latest")
-    audio_file = genai.upload_file(path=audio_file_path)
-    response = model.generate_content(
+    client = get_client()
+    audio_file = client.upload_file(audio_file_path)
+    response = client.generate(
         [
             "Transcribe audio with proper time stamping.",
             audio_file
@@ -1,25 +1,29 @@
 import os
+import sys
+from pathlib import Path
 import streamlit as st
-from faster_whisper import WhisperModel
-import torch
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from whisper_pool import get_whisper_pool
 
 # Function to transcribe audio using Faster Whisper
 def transcribe_audio(audio_path):
     try:
         st.write("Transcribing audio...")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = WhisperModel("base.en", device=device)
-        st.write(f"Model loaded on {device}")
-        
-        segments, info = model.transcribe(
-            audio=audio_path,
-            beam_size=5,
-            language="en",
-            max_new_tokens=128,
-            condition_on_previous_text=False
-        )
-        
-        extracted_texts = [[segment.text, segment.start, segment.end] for segment in segments]
+        # Warm models are shared across reruns and sessions
+        pool = get_whisper_pool()
+        with pool.model("base.en") as model:
+            st.write(f"Model loaded on {pool.key('base.en')[1]}")
+
+            segments, info = model.transcribe(
+                audio=audio_path,
+                beam_size=5,
+                language="en",
+                max_new_tokens=128,
+                condition_on_previous_text=False
+            )
+
+            # segments is lazy, consume it while the model is still borrowed
+            extracted_texts = [[segment.text, segment.start, segment.end] for segment in segments]
         return extracted_texts
     except Exception as e:
         st.error(f"Transcription Error: {e}")
@@ -1,15 +1,14 @@
-import os
 import streamlit as st
 from dotenv import load_dotenv
 from youtube_transcript_api import YouTubeTranscriptApi
-import google.generativeai as genai
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared modules live at the repo root
+from llm_client import get_client
 
 # Load environment variables
 load_dotenv()
 
-# Configure Google GenerativeAI
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 # Prompt for summarization
 prompt = """Welcome, Video Summarizer! Your task is to distill the essence of a given YouTube video transcript into a concise summary. Your summary should capture the key points and essential information, presented in bullet points, within a 250-word limit. Let's dive into the provided transcript and extract the vital details for our audience."""
 
@@ -31,8 +30,7 @@ def extract_transcript_details(youtube_video_url):
 
 # Function to generate summary using Google Gemini Pro
 def generate_gemini_content(transcript_text, prompt):
-    model = genai.GenerativeModel("gemini-pro")
-    response = model.generate_content(prompt + transcript_text)
+    response = get_client().generate(prompt + transcript_text, model="gemini-pro")
     return response.text
 
 
@@ -0,0 +1,476 @@
+"""HTTP job API in front of the Shortify pipeline.
+
+    python api_server.py --port 8600 --path-root /srv/videos
+
+Endpoints (JSON unless noted):
+
+    POST   /jobs                      submit {"path": ..., "options": {...}}, or upload the
+                                      video itself as the request body (options in the query,
+                                      plus ?filename=clip.mov to keep its extension)
+    GET    /jobs                      list jobs, newest first
+    GET    /jobs/<id>                 job status, progress, highlights and timings
+    DELETE /jobs/<id>                 cancel a queued or running job (or POST /jobs/<id>/cancel)
+    GET    /jobs/<id>/events          progress as server-sent events until the job finishes
+    GET    /jobs/<id>/shorts          the job's shorts with download URLs
+    GET    /jobs/<id>/shorts/<n>      short n (video/mp4, supports Range; ?inline=1 to play in the page)
+    GET    /health                    liveness plus queue depth
+
+Connections are kept alive (HTTP/1.1). The number of connections handled at
+once is capped; beyond that, and whenever the job queue is full, the server
+answers 429 with Retry-After straight away instead of queueing unboundedly.
+Jobs run on the shared JobManager pool (see jobs). Start with
+--llm-backend stub to swap Gemini for the local stand-in.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from contextlib import ExitStack
+from dataclasses import fields
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+
+# Before the project imports: they read their SHORTIFY_* settings when imported
+load_dotenv()
+
+from clip_files import RangeNotSatisfiable, get_clip_handles, parse_range
+from jobs import DONE, QueueFull, get_job_manager
+from media_cache import copy_with_digest
+from pipeline import TRANSCRIPTION_BACKENDS, PipelineOptions
+from workspace import get_workspace_manager
+
+MAX_UPLOAD_BYTES = int(os.getenv("SHORTIFY_API_MAX_UPLOAD_BYTES", str(4 * 1024 ** 3)))
+MAX_CONNECTIONS = int(os.getenv("SHORTIFY_API_MAX_CONNECTIONS", "64"))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 30
+EVENT_HEARTBEAT_SECONDS = 15
+RETRY_AFTER_SECONDS = 5
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+
+def parse_options(data):
+    """PipelineOptions from a JSON object or query parameters; rejects unknown keys and values."""
+    if data is not None and not isinstance(data, dict):
+        raise HTTPError(400, "options must be a JSON object")
+    data = dict(data or {})
+    backends = {backend: label for label, (backend, _, _) in TRANSCRIPTION_BACKENDS.items()}
+    if "transcription" in data:
+        name = data.pop("transcription")
+        if not isinstance(name, str) or name not in backends:
+            raise HTTPError(400, f"transcription must be one of {sorted(backends)}")
+        data["transcription_backend"] = backends[name]
+    elif "transcription_backend" in data and (not isinstance(data["transcription_backend"], str)
+                                              or data["transcription_backend"] not in TRANSCRIPTION_BACKENDS):
+        raise HTTPError(400, f"transcription_backend must be one of {sorted(TRANSCRIPTION_BACKENDS)}")
+    known = {f.name: f.type for f in fields(PipelineOptions)}
+    unknown = set(data) - set(known)
+    if unknown:
+        raise HTTPError(400, f"Unknown options {sorted(unknown)}")
+    for name, value in data.items():
+        if known[name] is not bool or isinstance(value, bool):
+            continue
+        # Query parameters arrive as strings
+        flag = value.lower() if isinstance(value, str) else None
+        if flag in TRUE_VALUES:
+            data[name] = True
+        elif flag in FALSE_VALUES:
+            data[name] = False
+        else:
+            raise HTTPError(400, f"{name} must be true or false")
+    return PipelineOptions(**data)
+
+
+def job_summary(job):
+    return {
+        "id": job.id, "state": job.state, "progress": job.progress,
+        "created_at": job.created_at, "finished_at": job.finished_at, "error": job.error,
+    }
+
+
+class ShortifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Shortify/1.0"
+    timeout = KEEPALIVE_TIMEOUT
+
+    ROUTES = [
+        ("GET", r"/health", "health"),
+        ("POST", r"/jobs", "submit"),
+        ("GET", r"/jobs", "list_jobs"),
+        ("GET", r"/jobs/(?P<job_id>\w+)", "get_job"),
+        ("DELETE", r"/jobs/(?P<job_id>\w+)", "cancel_job"),
+        ("POST", r"/jobs/(?P<job_id>\w+)/cancel", "cancel_job"),
+        ("GET", r"/jobs/(?P<job_id>\w+)/events", "events"),
+        ("GET", r"/jobs/(?P<job_id>\w+)/shorts", "list_shorts"),
+        ("GET", r"/jobs/(?P<job_id>\w+)/shorts/(?P<number>\d+)", "download_short"),
+    ]
+
+    @property
+    def manager(self):
+        return self.server.manager
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_HEAD(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self._body_read = False
+        try:
+            path_matched = False
+            for route_method, pattern, name in self.ROUTES:
+                match = re.fullmatch(pattern, url.path.rstrip("/") or "/")
+                if match:
+                    path_matched = True
+                    if route_method == method:
+                        return getattr(self, name)(**match.groupdict())
+            raise HTTPError(405 if path_matched else 404, "Method not allowed" if path_matched else "Not found")
+        except HTTPError as e:
+            self._discard_body()
+            self.send_json(e.status, {"error": str(e)}, headers=e.headers)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            self._discard_body()
+            self.send_json(500, {"error": f"Internal error: {e}"})
+        else:
+            self._discard_body()
+
+    def _discard_body(self):
+        """Skip an unread request body so the connection can be reused, or close it if that's too costly."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if self._body_read or not length:
+            return
+        if length > COPY_CHUNK_SIZE:
+            self.close_connection = True
+        else:
+            self.rfile.read(length)
+        self._body_read = True
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > COPY_CHUNK_SIZE:
+            raise HTTPError(413, "JSON body too large")
+        self._body_read = True
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def _job(self, job_id):
+        job = self.manager.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"No job {job_id}")
+        return job
+
+    # Handlers
+
+    def health(self):
+        jobs = self.manager.list_jobs()
+        self.send_json(200, {
+            "ok": True,
+            "queued": sum(job.state == "queued" for job in jobs),
+            "running": sum(job.state == "running" for job in jobs),
+        })
+
+    def submit(self):
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type == "application/json":
+            data = self.read_json()
+            options = parse_options(data.get("options"))
+            video_path = self._allowed_path(data.get("path"))
+            digest = None
+        else:
+            # The rest of the query string is pipeline options
+            options = dict(self.query)
+            filename = options.pop("filename", "")
+            options = parse_options(options)
+            video_path, digest = self._receive_upload(filename)
+        # An upload stays pinned until the job has taken its own pin on it
+        pinned = get_workspace_manager().owner(video_path) if digest else None
+        try:
+            job_id = self.manager.submit(video_path, digest, options)
+        except QueueFull as e:
+            raise HTTPError(429, str(e), {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        finally:
+            if pinned:
+                get_workspace_manager().release(pinned)
+        self.send_json(202, {"id": job_id, "status_url": f"/jobs/{job_id}"}, headers={"Location": f"/jobs/{job_id}"})
+
+    def _allowed_path(self, path):
+        if not path:
+            raise HTTPError(400, "Give a \"path\" or upload the video as the request body")
+        if not isinstance(path, str):
+            raise HTTPError(400, "path must be a string")
+        if not self.server.path_roots:
+            raise HTTPError(403, "Submitting by path is disabled; start the server with --path-root")
+        real = os.path.realpath(path)
+        if not any(os.path.commonpath([real, root]) == root for root in self.server.path_roots):
+            raise HTTPError(403, "Path is outside the allowed roots")
+        if not os.path.isfile(real):
+            raise HTTPError(404, f"No such file: {path}")
+        return real
+
+    def _receive_upload(self, filename=""):
+        """Stream the request body to scratch space, hashing it on the way.
+
+        The upload's workspace is returned pinned; `submit` releases it.
+        """
+        if "Content-Length" not in self.headers:
+            raise HTTPError(411, "Content-Length required")
+        length = int(self.headers["Content-Length"])
+        if length <= 0:
+            raise HTTPError(400, "Empty upload")
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPError(413, f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+        suffix = os.path.splitext(filename)[1] or ".mp4"
+        workspaces = get_workspace_manager()
+        self._body_read = True
+        with workspaces.incoming(suffix) as tmp_file:
+            try:
+                digest = copy_with_digest(self.rfile, tmp_file, length)
+            except (EOFError, OSError):
+                self.close_connection = True
+                raise HTTPError(400, "Upload ended early")
+            # Identical uploads share one file, evicted with the rest of scratch once unused
+            return workspaces.store_upload(tmp_file, digest, suffix, pin=True), digest
+
+    def list_jobs(self):
+        self.send_json(200, {"jobs": [job_summary(job) for job in self.manager.list_jobs()]})
+
+    def get_job(self, job_id):
+        self.send_json(200, self._job(job_id).to_dict())
+
+    def cancel_job(self, job_id):
+        job = self._job(job_id)
+        if not self.manager.cancel(job_id):
+            raise HTTPError(409, f"Job {job_id} already {job.state}")
+        self.send_json(202, {"id": job_id, "cancelling": True})
+
+    def events(self, job_id):
+        """Server-sent events: one "progress" event per change, then "end"."""
+        job = self._job(job_id)
+        self.close_connection = True  # the stream has no length, it ends when the connection does
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        version = -1
+        while True:
+            if job.version != version:
+                version = job.version
+                self.wfile.write(f"event: progress\ndata: {json.dumps(job_summary(job) | {'stages': job.stages})}\n\n".encode())
+            else:
+                self.wfile.write(b": keep-alive\n\n")
+            self.wfile.flush()
+            if job.finished:
+                self.wfile.write(f"event: end\ndata: {json.dumps({'state': job.state})}\n\n".encode())
+                self.wfile.flush()
+                return
+            job = self.manager.wait(job_id, version, timeout=EVENT_HEARTBEAT_SECONDS)
+
+    def _shorts(self, job):
+        """The job's clip paths; short n is always clips[n - 1], even once other clips are evicted."""
+        if job.state != DONE:
+            raise HTTPError(409, f"Job {job.id} is {job.state}")
+        return job.clips or []
+
+    def list_shorts(self, job_id):
+        shorts = []
+        for i, clip in enumerate(self._shorts(self._job(job_id))):
+            try:
+                size = os.path.getsize(clip)
+            except OSError:
+                # Evicted from the cache; the other shorts keep their numbers
+                continue
+            shorts.append({"number": i + 1, "url": f"/jobs/{job_id}/shorts/{i + 1}", "bytes": size})
+        self.send_json(200, {"shorts": shorts})
+
+    def download_short(self, job_id, number):
+        shorts = self._shorts(self._job(job_id))
+        index = int(number) - 1
+        if not 0 <= index < len(shorts):
+            raise HTTPError(404, f"Job {job_id} has no short {number}")
+        disposition = "inline" if self.query.get("inline") else "attachment"
+        with ExitStack() as stack:
+            # Only a failure to open the clip is a 404, errors while sending it are the connection's
+            try:
+                clip = stack.enter_context(get_clip_handles().open(shorts[index]))
+            except OSError:
+                raise HTTPError(404, f"Short {number} of job {job_id} is gone")
+            self.send_file(clip, f'{disposition}; filename="yt_short_{number}.mp4"')
+
+    def send_file(self, clip, disposition):
+        """Send a ClipFile, honouring Range, If-Range and If-None-Match."""
+        headers = {
+            "Content-Type": "video/mp4",
+            "Accept-Ranges": "bytes",
+            "ETag": clip.etag,
+            "Last-Modified": formatdate(clip.mtime, usegmt=True),
+            "Cache-Control": "private, max-age=3600",
+            "Content-Disposition": disposition,
+        }
+        if clip.etag in self.headers.get("If-None-Match", ""):
+            self._send_headers(304, headers)
+            return
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if not if_range or if_range == clip.etag:
+            try:
+                byte_range = parse_range(self.headers.get("Range"), clip.size)
+            except RangeNotSatisfiable as e:
+                raise HTTPError(416, "Range not satisfiable", {"Content-Range": str(e)})
+        start, end = byte_range or (0, clip.size - 1)
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{clip.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        self._send_headers(206 if byte_range else 200, headers)
+        if self.command == "HEAD":
+            return
+        try:
+            # Read from the shared handle chunk by chunk, the clip is never held whole
+            for chunk in clip.iter_range(start, end):
+                self.wfile.write(chunk)
+        except OSError as e:
+            # The status line is already out, so there's nothing to answer; typically the player
+            # went away or seeked elsewhere
+            self.close_connection = True
+            if not isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                self.log_error("Sending %s stopped: %s", clip.path, e)
+
+    def _send_headers(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+
+class ClipHandler(ShortifyHandler):
+    """Read-only: serves finished shorts and nothing else, for embedding in the Streamlit app."""
+
+    ROUTES = [
+        ("GET", r"/jobs/(?P<job_id>\w+)/shorts/(?P<number>\d+)", "download_short"),
+    ]
+
+
+class ShortifyServer(ThreadingHTTPServer):
+    """Thread per connection, with a hard cap on connections handled at once."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, manager=None, path_roots=(), max_connections=MAX_CONNECTIONS,
+                 handler=ShortifyHandler):
+        super().__init__(address, handler)
+        self.manager = manager or get_job_manager()
+        self.path_roots = [os.path.realpath(root) for root in path_roots]
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            # Saturated: answer at once rather than letting connections pile up
+            try:
+                body = json.dumps({"error": "Server is busy"}).encode("utf-8")
+                request.sendall(
+                    b"HTTP/1.1 429 Too Many Requests\r\nContent-Type: application/json\r\n"
+                    + f"Retry-After: {RETRY_AFTER_SECONDS}\r\nContent-Length: {len(body)}\r\n".encode()
+                    + b"Connection: close\r\n\r\n" + body
+                )
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def make_server(host="127.0.0.1", port=8600, manager=None, path_roots=(), max_connections=MAX_CONNECTIONS,
+                handler=ShortifyHandler):
+    """Build the server; pass `manager` to use your own JobManager (e.g. in tests)."""
+    return ShortifyServer((host, port), manager=manager, path_roots=path_roots, max_connections=max_connections,
+                          handler=handler)
+
+
+def serve_in_background(host="127.0.0.1", port=8600, manager=None, path_roots=(), handler=ShortifyHandler):
+    """Start a server on a daemon thread (e.g. inside the Streamlit process) and return it.
+
+    Pass `handler=ClipHandler` to expose only the short downloads.
+    """
+    server = make_server(host, port, manager=manager, path_roots=path_roots, handler=handler)
+    threading.Thread(target=server.serve_forever, name="shortify-api", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Shortify pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--path-root", action="append", default=[],
+                        help="directory jobs may be submitted from by path (repeatable); uploads always work")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--llm-backend", choices=["gemini", "stub"], help="overrides SHORTIFY_LLM_BACKEND")
+    args = parser.parse_args(argv)
+    if args.llm_backend:
+        os.environ["SHORTIFY_LLM_BACKEND"] = args.llm_backend
+
+    server = make_server(args.host, args.port, path_roots=args.path_root, max_connections=args.max_connections)
+    print(f"Shortify API listening on http://{args.host}:{args.port} ✅")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Speech-oriented audio extraction targets.
+
+Transcription needs a mono speech track, not 44.1 kHz stereo PCM. Each target
+trades size for how the audio is consumed:
+
+* "pcm16k" - 16 kHz mono 16-bit WAV, what local ASR models resample to anyway
+* "flac"   - the same signal losslessly compressed
+* "opus"   - 16 kHz mono Opus in Ogg, the smallest upload for Gemini
+* "aac"    - mono AAC in M4A; the source's own AAC track is stream-copied when
+             `allow_copy` is set, so no decode happens at all
+"""
+import os
+
+from ffmpeg_utils import probe_audio_codec, run_ffmpeg
+from workspace import current_workspace
+
+AUDIO_TARGETS = {
+    "pcm16k": (".wav", ["-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le"]),
+    "flac": (".flac", ["-ac", "1", "-ar", "16000", "-sample_fmt", "s16", "-c:a", "flac"]),
+    "opus": (".ogg", ["-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    "aac": (".m4a", ["-ac", "1", "-c:a", "aac", "-b:a", "64k"]),
+}
+
+DEFAULT_UPLOAD_TARGET = "opus"
+
+
+def extract_audio(video_path, target=DEFAULT_UPLOAD_TARGET, output_path=None, allow_copy=True):
+    """Extract the first audio track of `video_path` in the given target format.
+
+    Returns the path of the written audio file: `output_path`, else a file
+    in the current job's workspace, else one beside the video.
+    """
+    if target not in AUDIO_TARGETS:
+        raise ValueError(f"Unknown audio target '{target}', expected one of {sorted(AUDIO_TARGETS)}")
+    suffix, codec_args = AUDIO_TARGETS[target]
+    if output_path is None:
+        workspace = current_workspace()
+        if workspace is not None:
+            output_path = workspace.path(suffix, small=True)
+        else:
+            output_path = os.path.splitext(video_path)[0] + suffix
+
+    if target == "aac" and allow_copy and probe_audio_codec(video_path) in ("aac", None):
+        try:
+            run_ffmpeg(["-i", video_path, "-vn", "-map", "0:a:0", "-c:a", "copy", output_path])
+            return output_path
+        except RuntimeError:
+            # Codec unknown and not copyable into M4A, fall through to an encode
+            pass
+
+    run_ffmpeg(["-i", video_path, "-vn", "-map", "0:a:0"] + codec_args + [output_path])
+    return output_path
@@ -0,0 +1,236 @@
+"""Headless batch mode: run the Shortify pipeline over many videos.
+
+    python batch.py talks/ --output shorts/
+    python batch.py videos.txt --output shorts/ --workers 4 --stage-limit render=1
+
+The input is a directory of videos or a manifest: a text file with one path
+per line, or a .jsonl file of {"path": ...} objects. Videos are processed on
+a pool of worker threads. Each pipeline stage also has its own concurrency
+cap, so many videos can transcribe at once while renders don't oversubscribe
+the CPU. Unlike the app, batch mode renders once all of a video's highlights
+are in (no streaming by default): the highlight call is then its own stage,
+so one video's LLM wait overlaps with other videos' renders. Every finished video appends one line to a JSONL manifest with its
+shorts, highlights and per-stage timings. Rerunning the same command skips
+videos that are already done.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+# Before the project imports: they read their SHORTIFY_* settings when imported
+load_dotenv()
+
+from cancellation import CancelToken, cancel_scope
+from media_cache import file_digest
+from pipeline import STAGE_NAMES, TRANSCRIPTION_BACKENDS, PipelineOptions, run_pipeline
+from stage_scheduler import StageError
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".webm", ".m4v")
+
+# Concurrent runs of each stage across the whole batch; stages not listed are
+# only bounded by --workers
+DEFAULT_STAGE_LIMITS = {
+    "extract_audio": 4,
+    "scenes": 4,
+    "transcribe": 4,
+    "highlights": 4,
+    # A render runs one encoder process per clip, usually three or four, so
+    # allow about one render per four cores
+    "render": max(1, (os.cpu_count() or 1) // 4),
+}
+
+
+def find_videos(source, recursive=False):
+    """Video paths from a directory or a manifest file, in a stable order."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            paths += [os.path.join(root, name) for name in files if name.lower().endswith(VIDEO_EXTENSIONS)]
+            if not recursive:
+                break
+        return sorted(os.path.abspath(p) for p in paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if source.endswith(".jsonl") else line
+            paths.append(os.path.abspath(os.path.join(base, path)))
+    return paths
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_done(manifest_path):
+    """Entries of videos already finished in an earlier run, keyed by path."""
+    done = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if entry.get("status") == "done" and all(os.path.exists(p) for p in entry.get("shorts", [])):
+                done[entry["video"]] = entry
+            else:
+                done.pop(entry.get("video"), None)
+    return done
+
+
+class Batch:
+    def __init__(self, output_dir, options, stage_limits, manifest_path=None):
+        self.output_dir = output_dir
+        self.options = options
+        self.limits = {name: threading.BoundedSemaphore(n) for name, n in stage_limits.items() if n > 0}
+        self.manifest_path = manifest_path or os.path.join(output_dir, "manifest.jsonl")
+        self._manifest_lock = threading.Lock()
+        self.tokens = {}
+
+    def _write(self, entry):
+        with self._manifest_lock:
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _export(self, clips, video_path, digest):
+        """Copy the shorts out of the media cache, which may evict them later."""
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        out_dir = os.path.join(self.output_dir, f"{stem}-{digest[:8]}")
+        os.makedirs(out_dir, exist_ok=True)
+        shorts = []
+        for i, clip in enumerate(clips):
+            target = os.path.join(out_dir, f"short_{i + 1}.mp4")
+            try:
+                if os.path.exists(target):
+                    os.remove(target)
+                os.link(clip, target)
+            except OSError:
+                shutil.copyfile(clip, target)
+            shorts.append(target)
+        return shorts
+
+    def process(self, video_path):
+        entry = {"video": video_path, **_fingerprint(video_path), "started_at": time.time()}
+        token = self.tokens[video_path] = CancelToken()
+        try:
+            digest = file_digest(video_path)
+            entry["digest"] = digest
+            with cancel_scope(token):
+                values, report = run_pipeline(video_path, digest, self.options, limits=self.limits)
+            entry.update(status="done", shorts=self._export(values["clips"], video_path, digest),
+                         highlights=values.get("highlights"), timings=report.as_dict())
+        except StageError as e:
+            entry.update(status="cancelled" if token.cancelled else "failed", error=str(e), timings=e.report.as_dict())
+        except Exception as e:
+            entry.update(status="cancelled" if token.cancelled else "failed", error=str(e))
+        finally:
+            self.tokens.pop(video_path, None)
+        entry["finished_at"] = time.time()
+        self._write(entry)
+        return entry
+
+    def cancel_all(self):
+        for token in list(self.tokens.values()):
+            token.cancel()
+
+
+def parse_args(argv=None):
+    backends = {backend: label for label, (backend, _, _) in TRANSCRIPTION_BACKENDS.items()}
+    parser = argparse.ArgumentParser(description="Cut YouTube Shorts out of a whole directory of videos.")
+    parser.add_argument("source", help="directory of videos, or a manifest (.txt paths or .jsonl {\"path\": ...})")
+    parser.add_argument("-o", "--output", default="shorts", help="where shorts and manifest.jsonl are written")
+    parser.add_argument("--manifest", help="output manifest path (default: OUTPUT/manifest.jsonl)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also look in subdirectories")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="videos in flight at once")
+    parser.add_argument("--stage-limit", action="append", default=[], metavar="STAGE=N",
+                        help="max concurrent runs of a stage across the batch, e.g. render=2 (0 = unlimited)")
+    parser.add_argument("--transcription", choices=sorted(backends), default="gemini")
+    parser.add_argument("--llm-backend", choices=["gemini", "stub"], help="overrides SHORTIFY_LLM_BACKEND")
+    parser.add_argument("--no-captions", action="store_true", help="cut without burning in captions")
+    parser.add_argument("--no-crop", action="store_true", help="keep the source aspect ratio (with --no-captions)")
+    parser.add_argument("--center-crop", action="store_true", help="crop the middle of the frame instead of following the speaker")
+    parser.add_argument("--no-snap", action="store_true", help="keep the model's clip edges instead of moving them onto scene cuts")
+    parser.add_argument("--single-pass", action="store_true", help="render all of a video's shorts in one decode pass")
+    parser.add_argument("--stream", action="store_true",
+                        help="render each short as its highlight arrives; the combined highlights+render stage is "
+                             "then only bounded by --workers")
+    parser.add_argument("--force", action="store_true", help="reprocess videos the manifest lists as done")
+    args = parser.parse_args(argv)
+    args.transcription = backends[args.transcription]
+
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    for item in args.stage_limit:
+        name, _, value = item.partition("=")
+        if not value.isdigit():
+            parser.error(f"--stage-limit expects STAGE=N, got '{item}'")
+        if name not in STAGE_NAMES:
+            parser.error(f"--stage-limit: unknown stage '{name}', expected one of {', '.join(STAGE_NAMES)}")
+        limits[name] = int(value)
+    args.stage_limits = limits
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.llm_backend:
+        # Read when the LLM client is first used, so setting it here still applies
+        os.environ["SHORTIFY_LLM_BACKEND"] = args.llm_backend
+
+    options = PipelineOptions(
+        transcription_backend=args.transcription, burn_captions=not args.no_captions, crop=not args.no_crop,
+        reframe=not args.center_crop, snap_to_cuts=not args.no_snap, parallel=not args.single_pass,
+        stream=args.stream,
+    )
+    os.makedirs(args.output, exist_ok=True)
+    batch = Batch(args.output, options, args.stage_limits, args.manifest)
+
+    videos = find_videos(args.source, recursive=args.recursive)
+    done = {} if args.force else load_done(batch.manifest_path)
+    todo = [v for v in videos if not (v in done and {k: done[v][k] for k in ("size", "mtime")} == _fingerprint(v))]
+    print(f"{len(videos)} videos, {len(videos) - len(todo)} already done, {len(todo)} to process")
+
+    started = time.perf_counter()
+    counts = {"done": 0, "failed": 0, "cancelled": 0}
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="batch")
+    futures = {}
+    try:
+        for video in todo:
+            futures[pool.submit(batch.process, video)] = video
+        for n, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            counts[entry["status"]] += 1
+            took = entry["finished_at"] - entry["started_at"]
+            detail = f": {entry['error']}" if entry.get("error") else ""
+            print(f"[{n}/{len(todo)}] {entry['status']} {entry['video']} ({took:.1f}s){detail}")
+    except KeyboardInterrupt:
+        print("Interrupted, cancelling running videos (rerun the same command to resume)...")
+        for future in futures:
+            future.cancel()
+        batch.cancel_all()
+        pool.shutdown(wait=True)
+        return 130
+    pool.shutdown(wait=True)
+
+    print(f"Finished in {time.perf_counter() - started:.1f}s: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['cancelled']} cancelled ✅")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
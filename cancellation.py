@@ -0,0 +1,109 @@
+"""Cancellation of a running job and the subprocesses it started.
+
+A job runs with a `CancelToken` made current through a context variable.
+Code that starts ffmpeg (or a pool of render workers) registers it with
+whatever token is current, so cancelling the job kills those processes at
+once instead of waiting for the encode to finish. Without a current token,
+registering is a no-op.
+
+Thread pools only carry the token into their workers when the task is run
+through `contextvars.copy_context().run`, as stage_scheduler does.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("shortify_cancel_token", default=None)
+
+
+class Cancelled(Exception):
+    """Raised inside a job once it has been cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._processes = set()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Mark the job cancelled and kill everything registered with it."""
+        with self._lock:
+            self._cancelled.set()
+            processes = list(self._processes)
+            callbacks = list(self._callbacks)
+        for proc in processes:
+            if proc.poll() is None:
+                proc.kill()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled("Job was cancelled")
+
+    def add_process(self, proc):
+        """Track a subprocess.Popen; it's killed right away if the job is already cancelled."""
+        with self._lock:
+            self._processes.add(proc)
+            cancelled = self.cancelled
+        if cancelled and proc.poll() is None:
+            proc.kill()
+
+    def discard_process(self, proc):
+        with self._lock:
+            self._processes.discard(proc)
+
+    def add_callback(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+            cancelled = self.cancelled
+        if cancelled:
+            callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def current_token():
+    return _current.get()
+
+
+@contextmanager
+def cancel_scope(token):
+    """Make `token` current for the code in the with block."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+@contextmanager
+def tracked_process(proc):
+    """Register `proc` with the current token for the duration of the block."""
+    token = current_token()
+    if token is not None:
+        token.add_process(proc)
+    try:
+        yield proc
+    finally:
+        if token is not None:
+            token.discard_process(proc)
+
+
+def check_cancelled():
+    """Raise Cancelled if the current job has been cancelled."""
+    token = current_token()
+    if token is not None:
+        token.check()
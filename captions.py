@@ -0,0 +1,125 @@
+"""Timestamp-driven caption scheduling and sprite-based caption rendering.
+
+Before a clip is rendered, every output frame is mapped to the caption (if
+any) that is on screen at that frame's timestamp. The render loop then does a
+single array lookup per frame instead of per-frame timing logic.
+
+Each distinct caption is rasterised once with PIL from the bundled TTF font
+(stroke and drop shadow included) into a sprite; drawing it on a frame is a
+single vectorised alpha blend over the caption's bounding box, done with
+OpenCV's saturating uint8 arithmetic on the precomputed sprite arrays.
+"""
+import os
+import re
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arial.ttf")
+
+
+def clean_caption(text):
+    return re.sub(r"[^\w\s]", "", text).strip()
+
+
+def spread_words(words, start, end):
+    """Cues for untimed words, spread evenly over [start, end)."""
+    if not words:
+        return []
+    step = (end - start) / len(words)
+    return [(start + i * step, start + (i + 1) * step, word) for i, word in enumerate(words)]
+
+
+def build_caption_index(cues, clip_start, fps, total_frames):
+    """Map every frame of a clip to a caption.
+
+    `cues` are (start, end, text) triples in source-video seconds. Frame i of
+    the clip is shown at clip_start + i / fps. Returns (index, texts): an int32
+    array with one caption id per frame (-1 for no caption) and the caption
+    texts by id. Where cues overlap, the one that started last wins.
+    """
+    texts = []
+    if not cues or total_frames <= 0:
+        return np.full(max(total_frames, 0), -1, dtype=np.int32), texts
+
+    cues = sorted(cues, key=lambda cue: cue[0])
+    starts = np.array([cue[0] for cue in cues], dtype=np.float64)
+    ends = np.array([cue[1] for cue in cues], dtype=np.float64)
+    texts = [cue[2] for cue in cues]
+
+    frame_times = clip_start + np.arange(total_frames, dtype=np.float64) / fps
+    ids = np.searchsorted(starts, frame_times, side="right") - 1
+    visible = (ids >= 0) & (frame_times < ends[np.clip(ids, 0, None)])
+    return np.where(visible, ids, -1).astype(np.int32), texts
+
+
+class CaptionRenderer:
+    """Rasterises captions into cached RGBA sprites and blends them onto BGR frames.
+
+    One renderer per clip: sprites are sized for that clip's frame size.
+    """
+
+    def __init__(self, frame_width, frame_height, font_path=FONT_PATH, font_scale=0.055,
+                 color=(255, 255, 255), stroke_color=(0, 0, 0), shadow_color=(0, 0, 0, 160)):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.font_path = font_path
+        self.font_size = max(16, int(frame_height * font_scale))
+        self.bottom_margin = int(frame_height * 0.06)
+        self.max_width = int(frame_width * 0.92)
+        self.color = color
+        self.stroke_color = stroke_color
+        self.shadow_color = shadow_color
+        self._fonts = {}
+        self._sprites = {}
+
+    def _font(self, size):
+        if size not in self._fonts:
+            try:
+                self._fonts[size] = ImageFont.truetype(self.font_path, size)
+            except OSError:
+                self._fonts[size] = ImageFont.load_default(size=size)
+        return self._fonts[size]
+
+    def _rasterize(self, text, size):
+        font = self._font(size)
+        stroke = max(2, size // 12)
+        shadow = max(2, size // 20)
+        left, top, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox(
+            (0, 0), text, font=font, stroke_width=stroke)
+        image = Image.new("RGBA", (right - left + shadow, bottom - top + shadow), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        origin = (-left, -top)
+        draw.text((origin[0] + shadow, origin[1] + shadow), text, font=font, fill=self.shadow_color,
+                  stroke_width=stroke, stroke_fill=self.shadow_color)
+        draw.text(origin, text, font=font, fill=self.color, stroke_width=stroke, stroke_fill=self.stroke_color)
+        return image
+
+    def sprite(self, text):
+        """Return (premultiplied BGR, 255 - alpha) uint8 arrays for `text`, rasterising on first use."""
+        if text not in self._sprites:
+            size = self.font_size
+            image = self._rasterize(text, size)
+            if image.width > self.max_width:
+                # Too wide for a 9:16 frame, shrink the font rather than clip the word
+                size = max(8, int(size * self.max_width / image.width))
+                image = self._rasterize(text, size)
+            rgba = np.asarray(image, dtype=np.float32)
+            alpha = rgba[:, :, 3:4] / 255.0
+            bgr = np.round(rgba[:, :, 2::-1] * alpha).astype(np.uint8)
+            inv_alpha = np.repeat(np.round(255 - alpha * 255).astype(np.uint8), 3, axis=2)
+            self._sprites[text] = (bgr, inv_alpha)
+        return self._sprites[text]
+
+    def draw(self, frame, text):
+        """Alpha-blend the caption sprite onto the bottom of a BGR frame, in place."""
+        bgr, inv_alpha = self.sprite(text)
+        h, w = bgr.shape[:2]
+        h = min(h, frame.shape[0])
+        w = min(w, frame.shape[1])
+        x = (frame.shape[1] - w) // 2
+        y = max(0, frame.shape[0] - self.bottom_margin - h)
+        region = frame[y:y + h, x:x + w]
+        # region * (1 - alpha) + premultiplied sprite
+        cv2.add(cv2.multiply(region, inv_alpha[:h, :w], scale=1 / 255), bgr[:h, :w], dst=region)
@@ -0,0 +1,182 @@
+"""Chunked transcription for long audio.
+
+Long recordings are split at low-energy points into bounded chunks, the
+chunks are transcribed concurrently, and the
+per-chunk segments are shifted by the chunk offset and stitched back into
+one transcript. Wall-clock time tends towards the time of a single chunk
+instead of growing with the length of the talk.
+
+Rate limits and transient server errors are retried by the LLM client; a
+chunk is only retried here for the other failures, so the two layers never
+multiply.
+"""
+import contextvars
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_extract import AUDIO_TARGETS, DEFAULT_UPLOAD_TARGET
+from cancellation import check_cancelled, tracked_process
+from ffmpeg_utils import get_ffmpeg_exe, run_ffmpeg
+from llm_client import is_retryable
+from timeparse import format_timestamp, parse_seconds
+from workspace import scratch_dir
+
+MAX_CHUNK_SECONDS = 300
+# How far before the hard chunk limit to look for a quiet spot
+SPLIT_SEARCH_SECONDS = 30
+MAX_CONCURRENCY = 4
+CHUNK_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2.0
+
+ENERGY_SAMPLE_RATE = 8000
+ENERGY_WINDOW_SECONDS = 0.05
+
+
+def audio_energy(audio_path, sample_rate=ENERGY_SAMPLE_RATE, window_seconds=ENERGY_WINDOW_SECONDS):
+    """Return per-window RMS energy of `audio_path`, decoded as a low-rate mono stream.
+
+    The audio is consumed from ffmpeg in blocks, so memory use stays small even
+    for multi-hour recordings.
+    """
+    window = int(sample_rate * window_seconds)
+    block_bytes = window * 2 * 4096
+    cmd = [
+        get_ffmpeg_exe(), "-loglevel", "error", "-nostdin", "-i", audio_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    energies = []
+    leftover = b""
+    with tracked_process(proc):
+        try:
+            while True:
+                data = proc.stdout.read(block_bytes)
+                if not data:
+                    break
+                buf = leftover + data
+                usable = len(buf) // (2 * window) * (2 * window)
+                samples = np.frombuffer(buf[:usable], dtype=np.int16).astype(np.float32).reshape(-1, window)
+                energies.append(np.sqrt((samples ** 2).mean(axis=1)))
+                leftover = buf[usable:]
+        finally:
+            proc.stdout.close()
+            proc.wait()
+    if proc.returncode != 0:
+        check_cancelled()
+        raise RuntimeError(f"ffmpeg could not decode {audio_path}")
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+
+def find_split_points(energy, window_seconds=ENERGY_WINDOW_SECONDS,
+                      max_chunk_seconds=MAX_CHUNK_SECONDS, search_seconds=SPLIT_SEARCH_SECONDS):
+    """Return (start, end) chunk bounds in seconds, each no longer than max_chunk_seconds.
+
+    Every cut lands on the quietest point in the last `search_seconds` before
+    the limit, smoothed over a few windows so a gap between two words doesn't
+    beat a real pause.
+    """
+    total = len(energy) * window_seconds
+    # Never search back further than half a chunk, so chunks stay reasonably long
+    search_seconds = min(search_seconds, max_chunk_seconds / 2)
+    smooth = 5
+    bounds = [0.0]
+    while total - bounds[-1] > max_chunk_seconds:
+        chunk_start = bounds[-1]
+        hi = int((chunk_start + max_chunk_seconds) / window_seconds)
+        lo = int((chunk_start + max_chunk_seconds - search_seconds) / window_seconds)
+        if hi - lo <= smooth:
+            bounds.append(hi * window_seconds)
+            continue
+        smoothed = np.convolve(energy[lo:hi], np.ones(smooth) / smooth, mode="valid")
+        cut = lo + smooth // 2 + int(np.argmin(smoothed))
+        bounds.append(cut * window_seconds)
+    bounds.append(total)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_segments(text):
+    """Parse a model's JSON transcript (optionally in a ```json fence) into a list of segments."""
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    data = json.loads(match.group(0) if match else text)
+    if isinstance(data, dict):
+        data = [data]
+    return data
+
+
+def _transcribe_with_retries(transcribe_fn, chunk_path, retries, backoff):
+    for attempt in range(retries):
+        try:
+            return transcribe_fn(chunk_path)
+        except Exception as e:
+            # The LLM client has already spent its retries on these
+            if attempt == retries - 1 or is_retryable(e):
+                raise
+            print(f"Chunk {os.path.basename(chunk_path)} failed ({e}), retrying...")
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _transcribe_chunk(transcribe_fn, chunk_path, start, end, retries, backoff):
+    text = _transcribe_with_retries(transcribe_fn, chunk_path, retries, backoff) or ""
+    try:
+        segments = parse_segments(text)
+    except (ValueError, AttributeError):
+        # Not JSON, keep the text so nothing said in this chunk is lost
+        return [{"text": text.strip(), "start": format_timestamp(start), "end": format_timestamp(end)}]
+
+    stitched = []
+    for segment in segments:
+        try:
+            seg_start = min(start + parse_seconds(segment["start"]), end)
+            seg_end = min(start + parse_seconds(segment["end"]), end)
+        except (KeyError, ValueError, TypeError):
+            seg_start, seg_end = start, end
+        stitched.append({
+            "text": str(segment.get("text", "")).strip(),
+            "start": format_timestamp(seg_start),
+            "end": format_timestamp(seg_end),
+        })
+    return stitched
+
+
+def transcribe_chunked(audio_path, transcribe_fn, max_chunk_seconds=MAX_CHUNK_SECONDS,
+                       max_concurrency=MAX_CONCURRENCY, retries=CHUNK_RETRIES,
+                       backoff=RETRY_BACKOFF_SECONDS, target=DEFAULT_UPLOAD_TARGET):
+    """Transcribe `audio_path` in silence-aligned chunks.
+
+    `transcribe_fn(chunk_path)` must return the model's text for one chunk,
+    with timestamps relative to the chunk. Returns the stitched list of
+    {"text", "start", "end"} segments with absolute HH:MM:SS.mmm timestamps.
+    """
+    bounds = find_split_points(audio_energy(audio_path), max_chunk_seconds=max_chunk_seconds)
+    if len(bounds) <= 1:
+        end = bounds[0][1] if bounds else 0.0
+        return _transcribe_chunk(transcribe_fn, audio_path, 0.0, end, retries, backoff)
+
+    suffix, codec_args = AUDIO_TARGETS[target]
+    with tempfile.TemporaryDirectory(dir=scratch_dir(small=True)) as tmp_dir:
+        chunk_paths = []
+        for i, (start, end) in enumerate(bounds):
+            chunk_path = os.path.join(tmp_dir, f"chunk_{i:03d}{suffix}")
+            run_ffmpeg(["-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", audio_path, "-vn"]
+                       + codec_args + [chunk_path])
+            chunk_paths.append(chunk_path)
+        print(f"Split audio into {len(chunk_paths)} chunks ✅")
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunk_paths)))) as pool:
+            # Each chunk runs in a copy of this context, so it sees the job's cancel token and workspace
+            futures = [
+                pool.submit(contextvars.copy_context().run, _transcribe_chunk,
+                            transcribe_fn, chunk_path, start, end, retries, backoff)
+                for chunk_path, (start, end) in zip(chunk_paths, bounds)
+            ]
+            segments = []
+            for future in futures:
+                segments.extend(future.result())
+    return segments
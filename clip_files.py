@@ -0,0 +1,154 @@
+"""Open-file handles for serving rendered shorts straight from disk.
+
+Each short is opened once and the handle reused by every request for it, so
+serving a clip costs neither a fresh open/stat nor a copy of the file in
+memory: byte ranges are read with os.pread, which doesn't move a shared file
+offset and so is safe across threads. Handles are closed least recently used
+first once more than MAX_OPEN_CLIPS are open (after any request still
+reading from them finishes), and reopened when the file on disk changes.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_OPEN_CLIPS = int(os.getenv("SHORTIFY_MAX_OPEN_CLIPS", "64"))
+READ_CHUNK_SIZE = 1024 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range `Range` header, or None to send the whole file.
+
+    Multi-range and malformed headers are ignored (the whole file is sent), as
+    RFC 9110 allows. Raises RangeNotSatisfiable for ranges past the end.
+    """
+    match = _RANGE.fullmatch((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or (last and int(last) < start):
+            raise RangeNotSatisfiable(f"bytes */{size}")
+    else:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(f"bytes */{size}")
+        start, end = max(0, size - length), size - 1
+    return start, end
+
+
+class ClipFile:
+    """An open read-only handle on one clip, with the metadata needed for HTTP caching."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        stat = os.fstat(self.fd)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.etag = f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self._lock = threading.Lock()
+        self._users = 0
+        self._closing = False
+
+    def _acquire(self):
+        with self._lock:
+            self._users += 1
+
+    def _release(self):
+        with self._lock:
+            self._users -= 1
+            close = self._closing and not self._users
+        if close:
+            self._close_fd()
+
+    def is_current(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime) == (self.size, self.mtime)
+
+    def iter_range(self, start, end, chunk_size=READ_CHUNK_SIZE):
+        """Yield bytes start..end (inclusive) in chunks."""
+        offset = start
+        while offset <= end:
+            chunk = os.pread(self.fd, min(chunk_size, end - offset + 1), offset)
+            if not chunk:
+                break
+            yield chunk
+            offset += len(chunk)
+
+    def close(self):
+        """Close once no request is still reading from the handle."""
+        with self._lock:
+            self._closing = True
+            if self._users:
+                return
+        self._close_fd()
+
+    def _close_fd(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class ClipHandles:
+    """LRU cache of ClipFile handles keyed by path."""
+
+    def __init__(self, max_open=MAX_OPEN_CLIPS):
+        self.max_open = max_open
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path):
+        """Use an open ClipFile for `path`, opening it if needed. Raises OSError if it can't be read."""
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None and not handle.is_current():
+                # Replaced on disk since it was opened
+                del self._handles[path]
+                handle.close()
+                handle = None
+            if handle is None:
+                handle = self._handles[path] = ClipFile(path)
+                while len(self._handles) > self.max_open:
+                    _, old = self._handles.popitem(last=False)
+                    old.close()
+            self._handles.move_to_end(path)
+            handle._acquire()
+        try:
+            yield handle
+        finally:
+            handle._release()
+
+    def close_all(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+
+
+_handles = None
+_handles_lock = threading.Lock()
+
+
+def get_clip_handles():
+    """Return the process-wide clip handle cache."""
+    global _handles
+    with _handles_lock:
+        if _handles is None:
+            _handles = ClipHandles()
+        return _handles
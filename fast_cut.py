@@ -0,0 +1,188 @@
+"""Fast cut mode for highlights that need no per-frame changes.
+
+Without captions the Python frame loop is pure overhead:
+
+* no crop: the clip is stream-copied from keyframe-aligned boundaries, so it
+  costs roughly I/O time. With `accurate=True` only the short stretch from the
+  requested start to the next keyframe is re-encoded ("smart cut"), with the
+  source's profile, level, pixel format and timescale; a smart cut that
+  doesn't come out with the right number of frames is redone as a full
+  re-encode.
+* crop only: ffmpeg crops and encodes natively in one pass, with the audio
+  stream-copied. A crop can't be stream-copied, but this still skips decoding
+  into Python.
+"""
+import os
+import tempfile
+
+from ffmpeg_utils import count_video_frames, keyframe_times, probe_video_stream, run_ffmpeg
+from workspace import scratch_dir, scratch_path
+
+# A requested start this close to a keyframe is treated as already aligned
+KEYFRAME_TOLERANCE = 0.05
+
+# How far past the start to look for the next keyframe when smart cutting
+KEYFRAME_SEARCH_WINDOW = 30
+
+# The tail copy seeks this far past the keyframe: ffmpeg starts a copy at the
+# last sync sample at or before the seek point, and ffprobe's printed pts can
+# round down below the real one, which would land a whole GOP early
+KEYFRAME_SEEK_EPSILON = 0.001
+
+# How many frames the copied tail, or the whole smart cut, may be off from the
+# requested range before it's thrown away and the clip re-encoded. A tail that
+# started on an earlier sync sample is a whole GOP too long
+FRAME_COUNT_TOLERANCE = 2
+
+# Source H.264 profiles the re-encoded head can match, as ffprobe names them
+X264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"}
+HEAD_PIX_FMTS = ("yuv420p", "yuvj420p")
+
+
+def fast_cut(video_file, start, end, output_path=None, crop=None, accurate=False):
+    """Cut [start, end) seconds out of `video_file` without a Python frame loop.
+
+    `crop` is an optional (x1, x2) column range, cropped at full height.
+    Returns the output path.
+    """
+    if output_path is None:
+        output_path = scratch_path(".mp4")
+    duration = end - start
+
+    if crop is not None:
+        x1, x2 = crop
+        run_ffmpeg([
+            "-ss", f"{start:.3f}", "-i", video_file, "-t", f"{duration:.3f}",
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"crop={x2 - x1}:ih:{x1}:0,pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p",
+            "-c:a", "copy", "-movflags", "+faststart",
+            output_path,
+        ])
+        return output_path
+
+    if accurate:
+        keyframes = keyframe_times(video_file, start, start + KEYFRAME_SEARCH_WINDOW)
+        stream = probe_video_stream(video_file)
+        next_key = next((t for t in keyframes or () if t >= start - KEYFRAME_TOLERANCE), None)
+        if stream is None or stream.get("codec_name") != "h264" or next_key is None or next_key >= end:
+            # Nothing to line a re-encoded head up with (unknown keyframes or codec, or the whole
+            # clip comes before the next keyframe), re-encode it all
+            _reencode(video_file, start, duration, output_path)
+        elif next_key - start > KEYFRAME_TOLERANCE:
+            if not _smart_cut(video_file, stream, start, next_key, end, output_path):
+                print("Smart cut didn't line up with its keyframe, re-encoding the whole clip")
+                _reencode(video_file, start, duration, output_path)
+        else:
+            # Already on a keyframe; seek just past it so the copy can't start a GOP early
+            seek = next_key + KEYFRAME_SEEK_EPSILON
+            _stream_copy(video_file, seek, end - seek, output_path)
+        return output_path
+
+    _stream_copy(video_file, start, duration, output_path)
+    return output_path
+
+
+def _stream_copy(video_file, start, duration, output_path, audio=True):
+    run_ffmpeg([
+        "-ss", f"{start:.3f}", "-i", video_file, "-t", f"{duration:.3f}",
+        "-map", "0:v:0"] + (["-map", "0:a:0?"] if audio else ["-an"]) + [
+        "-c", "copy", "-avoid_negative_ts", "make_zero", "-movflags", "+faststart",
+        output_path,
+    ])
+
+
+def _reencode(video_file, start, duration, output_path, audio=True):
+    run_ffmpeg([
+        "-ss", f"{start:.3f}", "-i", video_file, "-t", f"{duration:.3f}",
+        "-map", "0:v:0"] + (["-map", "0:a:0?", "-c:a", "aac"] if audio else ["-an"]) + [
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+        output_path,
+    ])
+
+
+def _frame_rate(stream):
+    """The source's frame rate as a float, or None."""
+    num, _, den = stream.get("r_frame_rate", "").partition("/")
+    try:
+        return float(num) / float(den or 1) or None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _head_encode_args(stream):
+    """libx264 arguments producing a head the source's tail can follow, or None if x264 can't match it.
+
+    Profile, level, pixel format and frame rate follow the source, so the two
+    halves decode with the same settings.
+    """
+    profile = X264_PROFILES.get(stream.get("profile"))
+    pix_fmt = stream.get("pix_fmt")
+    if profile is None or pix_fmt not in HEAD_PIX_FMTS or _frame_rate(stream) is None:
+        return None
+    args = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+            "-profile:v", profile, "-pix_fmt", pix_fmt, "-r", stream["r_frame_rate"]]
+    level = stream.get("level")
+    if isinstance(level, int) and level > 0:
+        args += ["-level", f"{level / 10:.1f}"]
+    return args
+
+
+def _timescale(stream):
+    """The source's track timescale (the time_base denominator), or None."""
+    _, _, den = stream.get("time_base", "").partition("/")
+    return den if den.isdigit() and int(den) > 0 else None
+
+
+def _smart_cut(video_file, stream, start, keyframe, end, output_path):
+    """Re-encode [start, keyframe), stream-copy [keyframe, end), then mux the source audio.
+
+    Both halves are written at the source's track timescale, and the tail's
+    SPS/PPS are repeated in-band at its keyframes, so after the join (which
+    keeps only the head's parameter sets in the header) the tail still
+    decodes with its own. Returns False if the head can't be made to match the
+    source, the copied tail didn't start exactly at `keyframe`, or the output
+    doesn't hold the frames asked for; `output_path` is then left for the
+    caller to overwrite.
+    """
+    head_args = _head_encode_args(stream)
+    if head_args is None:
+        return False
+    fps = _frame_rate(stream)
+    timescale = _timescale(stream)
+    timescale_args = ["-video_track_timescale", timescale] if timescale else []
+
+    with tempfile.TemporaryDirectory(dir=scratch_dir()) as tmp_dir:
+        head = os.path.join(tmp_dir, "head.mp4")
+        tail = os.path.join(tmp_dir, "tail.mp4")
+        joined = os.path.join(tmp_dir, "joined.mp4")
+        concat_list = os.path.join(tmp_dir, "concat.txt")
+
+        seek = keyframe + KEYFRAME_SEEK_EPSILON
+        run_ffmpeg([
+            "-ss", f"{seek:.3f}", "-i", video_file, "-t", f"{end - seek:.3f}", "-map", "0:v:0", "-an",
+            "-c", "copy", "-bsf:v", "h264_mp4toannexb"] + timescale_args + [tail])
+        # A copy starting on an earlier sync sample comes out longer by exactly that pre-roll
+        tail_frames = count_video_frames(tail)
+        if tail_frames is None or tail_frames - round((end - keyframe) * fps) > FRAME_COUNT_TOLERANCE:
+            return False
+        run_ffmpeg([
+            "-ss", f"{start:.3f}", "-i", video_file, "-t", f"{keyframe - start:.3f}", "-map", "0:v:0", "-an",
+        ] + head_args + timescale_args + [head])
+        with open(concat_list, "w") as f:
+            f.write(f"file '{head}'\nfile '{tail}'\n")
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", concat_list, "-c", "copy"] + timescale_args + [joined])
+
+        # Audio never needed re-encoding, copy the exact range from the source
+        run_ffmpeg([
+            "-i", joined, "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", video_file,
+            "-map", "0:v:0", "-map", "1:a:0?", "-c", "copy", "-shortest",
+        ] + timescale_args + ["-movflags", "+faststart", output_path])
+
+    # The tail check alone misses a join that drops or repeats video, count what came out
+    expected = round((end - start) * fps)
+    frames = count_video_frames(output_path)
+    if frames is None or abs(frames - expected) > FRAME_COUNT_TOLERANCE:
+        print(f"Smart cut produced {frames} frames, expected about {expected}")
+        return False
+    return True
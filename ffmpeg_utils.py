@@ -0,0 +1,272 @@
+"""Helpers for locating and driving the ffmpeg binary."""
+import json
+import shutil
+import subprocess
+from functools import lru_cache
+
+from cancellation import check_cancelled, current_token, tracked_process
+
+
+@lru_cache(maxsize=None)
+def get_ffmpeg_exe():
+    """Return the ffmpeg binary bundled with moviepy (imageio-ffmpeg), or the one on PATH."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+@lru_cache(maxsize=None)
+def get_ffprobe_exe():
+    """Return the ffprobe binary if one is installed, else None (imageio-ffmpeg ships only ffmpeg)."""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        # Called once per process (cached), so this is logged once
+        print("ffprobe not found: probing falls back to OpenCV and cuts without captions are fully re-encoded "
+              "instead of stream-copied. Install ffmpeg's ffprobe to enable fast cuts.")
+    return ffprobe
+
+
+def run_ffmpeg(args):
+    """Run ffmpeg with `args`, raising RuntimeError with its stderr on failure."""
+    cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-nostdin"] + list(args)
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    with tracked_process(proc):
+        _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        check_cancelled()
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+def run_ffprobe(args):
+    """Run ffprobe with `args` and return its stdout, or None when ffprobe is unavailable or fails."""
+    ffprobe = get_ffprobe_exe()
+    if ffprobe is None:
+        return None
+    proc = subprocess.run([ffprobe, "-v", "error"] + list(args), capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def probe_codec(path, stream="v:0"):
+    """Return the codec name of `stream` (e.g. "h264", "aac"), or None if unknown."""
+    out = run_ffprobe(["-select_streams", stream, "-show_entries", "stream=codec_name", "-of", "csv=p=0", path])
+    if out is None:
+        return None
+    return out.strip() or None
+
+
+def probe_video_codec(path):
+    """Return the codec name of the first video stream, or None if unknown."""
+    return probe_codec(path, "v:0")
+
+
+def probe_audio_codec(path):
+    """Return the codec name of the first audio stream, or None if unknown."""
+    return probe_codec(path, "a:0")
+
+
+def probe_video_stream(path):
+    """Return the first video stream's codec parameters as ffprobe reports them, or None if unknown.
+
+    Keys: codec_name, profile, level, pix_fmt, time_base and r_frame_rate.
+    """
+    out = run_ffprobe([
+        "-select_streams", "v:0", "-show_entries", "stream=codec_name,profile,level,pix_fmt,time_base,r_frame_rate",
+        "-of", "json", path,
+    ])
+    if out is None:
+        return None
+    try:
+        return json.loads(out)["streams"][0]
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def count_video_frames(path):
+    """Return the number of frames in the first video stream, or None if ffmpeg can't read it.
+
+    Counts packets with a stream copy to the framecrc muxer (one line per
+    packet), so it needs only ffmpeg and decodes nothing.
+    """
+    cmd = [
+        get_ffmpeg_exe(), "-loglevel", "error", "-nostdin", "-i", path, "-map", "0:v:0", "-c", "copy",
+        "-f", "framecrc", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    with tracked_process(proc):
+        stdout, _ = proc.communicate()
+    if proc.returncode != 0:
+        check_cancelled()
+        return None
+    return sum(1 for line in stdout.splitlines() if line and not line.startswith("#"))
+
+
+def probe_video_info(path):
+    """Return {"duration", "width", "height", "fps"} of the first video stream, or None if unknown.
+
+    Reads only the container headers, unlike opening the file with moviepy.
+    """
+    out = run_ffprobe([
+        "-select_streams", "v:0", "-show_entries", "stream=width,height,avg_frame_rate:format=duration",
+        "-of", "json", path,
+    ])
+    if out is None:
+        return None
+    try:
+        data = json.loads(out)
+        stream = data["streams"][0]
+        num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+        fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+        return {
+            "duration": float(data["format"]["duration"]),
+            "width": int(stream["width"]),
+            "height": int(stream["height"]),
+            "fps": fps,
+        }
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def iter_gray_frames(path, size, fps=None, start=None, duration=None, batch_frames=512):
+    """Decode `path` scaled to `size` (w, h) grey, yielding (frames, h, w) uint8 arrays of up to `batch_frames`.
+
+    Meant for cheap analysis passes: the loop filter is skipped, and with
+    `fps` set (resampling anyway) so are non-reference frames. Frames are
+    read as they are decoded, so memory stays bounded on long videos.
+    """
+    import numpy as np
+
+    width, height = size
+    cmd = [get_ffmpeg_exe(), "-loglevel", "error", "-nostdin", "-skip_loop_filter", "all"]
+    if fps:
+        cmd += ["-skip_frame", "noref"]
+    if start is not None:
+        cmd += ["-ss", f"{start:.3f}"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    filters = ([f"fps={fps}"] if fps else []) + [f"scale={width}:{height}:flags=area", "format=gray"]
+    cmd += ["-i", path, "-an", "-vf", ",".join(filters), "-f", "rawvideo", "-"]
+
+    frame_bytes = width * height
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with tracked_process(proc):
+        try:
+            while True:
+                data = proc.stdout.read(frame_bytes * batch_frames)
+                count = len(data) // frame_bytes
+                if count:
+                    yield np.frombuffer(data, dtype=np.uint8, count=count * frame_bytes).reshape(count, height, width)
+                if len(data) < frame_bytes * batch_frames:
+                    break
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+            proc.wait()
+    if proc.returncode != 0:
+        check_cancelled()
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+def read_gray_frames(path, start, duration, fps, size):
+    """All frames of [start, start + duration) at `fps`, scaled to `size` grey, as one (frames, h, w) array."""
+    import numpy as np
+
+    width, height = size
+    batches = list(iter_gray_frames(path, size, fps=fps, start=start, duration=duration))
+    return np.concatenate(batches) if batches else np.zeros((0, height, width), dtype=np.uint8)
+
+
+def keyframe_times(path, start=None, end=None):
+    """Return sorted sync-sample timestamps (seconds) of the first video stream, or None if unknown.
+
+    These come from the demuxer's packet keyframe flags, i.e. the points a
+    stream copy can actually start at. Decoded I-frames (`-skip_frame nokey`)
+    would also include non-IDR I-frames, which a copy can't start from.
+    Only the packets between `start` and `end` are scanned when they are given.
+    """
+    args = ["-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0"]
+    if start is not None or end is not None:
+        args += ["-read_intervals", f"{start or 0}%{end if end is not None else ''}"]
+    out = run_ffprobe(args + [path])
+    if out is None:
+        return None
+    times = []
+    for line in out.splitlines():
+        pts_time, _, flags = line.strip().partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.append(float(pts_time))
+    return sorted(times)
+
+
+class FFmpegClipWriter:
+    """Stream raw BGR frames into a single libx264 encode with the source audio muxed in.
+
+    The audio for [start, start + duration) is read straight from `audio_source`
+    in the same ffmpeg process, so every short is encoded exactly once and no
+    intermediate video file is written.
+    """
+
+    def __init__(self, output_path, fps, size, audio_source=None, start=0.0, duration=None,
+                 preset="veryfast", crf=20):
+        width, height = size
+        cmd = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "error", "-nostdin",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+        ]
+        if audio_source is not None:
+            cmd += ["-ss", f"{start:.3f}"]
+            if duration is not None:
+                cmd += ["-t", f"{duration:.3f}"]
+            cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "aac", "-b:a", "128k"]
+        cmd += [
+            # libx264 with yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart", "-shortest",
+            output_path,
+        ]
+        self.output_path = output_path
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = None
+        # Killed straight away if the job that started it is cancelled
+        self._token = current_token()
+        if self._token is not None:
+            self._token.add_process(self.proc)
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            self.release()
+
+    def release(self):
+        """Finish the encode. Raises RuntimeError if ffmpeg failed."""
+        self._finish()
+        if self.proc.returncode != 0:
+            check_cancelled()
+            raise RuntimeError(f"ffmpeg failed for {self.output_path}: {self._stderr.decode(errors='replace').strip()}")
+
+    def abort(self):
+        """Kill the encoder without waiting for it to finish."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self._finish()
+
+    def _finish(self):
+        if self._stderr is not None:
+            return
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._stderr = self.proc.stderr.read()
+        self.proc.stderr.close()
+        self.proc.wait()
+        if self._token is not None:
+            self._token.discard_process(self.proc)
+
@@ -0,0 +1,132 @@
+"""Registry of uploaded LLM file handles, keyed by content hash.
+
+Gemini keeps uploaded files for about 48 hours. Instead of re-uploading the
+same audio for every retry and repeat job, the registry remembers which
+remote file holds which content and hands back the existing handle while it
+is still valid. A background thread deletes handles that have expired or
+have not been used for a while, so remote storage doesn't pile up.
+
+The registry file is shared by every process using the same cache (the app,
+the API server, batch runs). Each change re-reads it and writes it back under
+an exclusive lock on a sibling lock file, so processes never overwrite each
+other's entries.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from media_cache import CACHE_DIR, file_digest
+
+REGISTRY_PATH = os.path.join(CACHE_DIR, "remote_files.json")
+# Treat handles as expired this long before the server says so
+EXPIRY_MARGIN_SECONDS = 30 * 60
+# Gemini's retention when the handle doesn't report an expiration time
+DEFAULT_TTL_SECONDS = 47 * 3600
+# Handles unused for this long are deleted remotely
+IDLE_TTL_SECONDS = 6 * 3600
+GC_INTERVAL_SECONDS = 10 * 60
+
+
+def _expiration(handle):
+    expiration = getattr(handle, "expiration_time", None)
+    if expiration is not None and hasattr(expiration, "timestamp"):
+        return expiration.timestamp()
+    return time.time() + DEFAULT_TTL_SECONDS
+
+
+class RemoteFileRegistry:
+    """Maps content digests to uploaded file names on a backend."""
+
+    def __init__(self, backend, path=REGISTRY_PATH, idle_ttl=IDLE_TTL_SECONDS, gc_interval=GC_INTERVAL_SECONDS):
+        self.backend = backend
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        if gc_interval:
+            thread = threading.Thread(target=self._gc_loop, args=(gc_interval,), daemon=True)
+            thread.start()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _locked(self):
+        """Hold this process's lock and the cross-process lock file, with entries fresh from disk."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._entries = self._load()
+                    yield self._entries
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def upload(self, path, upload_fn, digest=None):
+        """Return a handle for the file at `path`, reusing a live upload of the same content.
+
+        `upload_fn(path)` performs the actual upload on a miss.
+        """
+        digest = digest or file_digest(path)
+        now = time.time()
+        with self._locked() as entries:
+            # Possibly uploaded by another process
+            entry = entries.get(digest)
+        if entry and entry["expires_at"] - EXPIRY_MARGIN_SECONDS > now:
+            try:
+                handle = self.backend.get_file(entry["name"])
+                with self._locked() as entries:
+                    if entries.get(digest, {}).get("name") == entry["name"]:
+                        entries[digest]["last_used"] = now
+                        self._save()
+                print(f"Reusing uploaded file {entry['name']} ✅")
+                return handle
+            except Exception:
+                # Deleted or expired remotely, upload again
+                pass
+
+        handle = upload_fn(path)
+        with self._locked() as entries:
+            entries[digest] = {"name": handle.name, "expires_at": _expiration(handle), "last_used": now}
+            self._save()
+        return handle
+
+    def collect(self):
+        """Drop expired handles and delete ones idle for longer than idle_ttl."""
+        now = time.time()
+        with self._locked() as entries:
+            expired = [d for d, e in entries.items() if e["expires_at"] <= now]
+            idle = [d for d, e in entries.items() if d not in expired and now - e["last_used"] > self.idle_ttl]
+            stale = {d: entries.pop(d) for d in expired + idle}
+            if stale:
+                self._save()
+        for digest in idle:
+            try:
+                self.backend.delete_file(stale[digest]["name"])
+            except Exception as e:
+                print(f"Could not delete remote file {stale[digest]['name']}: {e}")
+        return len(stale)
+
+    def _gc_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Remote file cleanup failed: {e}")
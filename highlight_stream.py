@@ -0,0 +1,100 @@
+"""Incremental parsing of a streamed JSON highlight array.
+
+The model answers the highlight prompt with a JSON array, usually inside a
+```json fence. Fed the response chunk by chunk, `JSONArrayStream` returns each
+top-level object the moment its closing brace arrives, so the first highlight
+can start rendering while the model is still writing the others.
+"""
+import json
+
+from timeparse import parse_seconds
+
+
+class JSONArrayStream:
+    """Pull complete objects out of a JSON array that arrives in pieces.
+
+    Text before the opening "[" (a code fence, a stray sentence) is ignored,
+    and so is anything after the closing "]".
+    """
+
+    def __init__(self):
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current = []
+
+    def feed(self, text):
+        """Consume a chunk of text and return the objects completed by it."""
+        objects = []
+        for char in text:
+            if self._finished:
+                break
+            if not self._started:
+                self._started = char == "["
+                continue
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                elif char == "]":
+                    self._finished = True
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._current)))
+                    except ValueError as e:
+                        print(f"Skipping malformed object in JSON stream: {e}")
+                    self._current = []
+        return objects
+
+
+def validate_highlight(highlight):
+    """Check one highlight against the prompt's schema and return it.
+
+    A highlight needs parseable "start" and "end" times with end after start;
+    "highlight" defaults to an empty string. Raises ValueError otherwise.
+    """
+    if not isinstance(highlight, dict):
+        raise ValueError(f"Highlight is not an object: {highlight!r}")
+    for key in ("start", "end"):
+        if key not in highlight:
+            raise ValueError(f"Highlight is missing '{key}': {highlight!r}")
+    start = parse_seconds(highlight["start"])
+    end = parse_seconds(highlight["end"])
+    if end <= start:
+        raise ValueError(f"Highlight ends before it starts: {highlight!r}")
+    if not isinstance(highlight.setdefault("highlight", ""), str):
+        raise ValueError(f"Highlight text is not a string: {highlight!r}")
+    return highlight
+
+
+def iter_highlights(chunks):
+    """Yield validated highlights from streamed response text as each one completes.
+
+    Objects that fail validation are reported and skipped rather than ending
+    the stream.
+    """
+    parser = JSONArrayStream()
+    for chunk in chunks:
+        for highlight in parser.feed(chunk):
+            try:
+                yield validate_highlight(highlight)
+            except ValueError as e:
+                print(f"Skipping invalid highlight: {e}")
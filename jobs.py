@@ -0,0 +1,289 @@
+"""Background jobs that run the pipeline off the Streamlit script thread.
+
+`submit` returns a job id straight away. Jobs run on a bounded pool of worker
+threads shared by every session, so a burst of uploads queues up instead of
+running dozens of renders at once. Each job reports per-stage progress, can
+be cancelled (killing its ffmpeg encoders and render workers, see
+cancellation), and is saved as JSON under the cache directory so its status
+and results outlive page refreshes and restarts. Finished jobs are forgotten
+after SHORTIFY_JOB_RETENTION_SECONDS, and beyond the newest
+SHORTIFY_MAX_KEPT_JOBS, so neither memory nor the jobs directory grows
+without bound.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+
+from cancellation import CancelToken, cancel_scope
+from media_cache import CACHE_DIR, file_digest
+from pipeline import PipelineOptions, run_pipeline
+from stage_scheduler import StageError
+from workspace import get_workspace_manager
+
+JOBS_DIR = os.path.join(CACHE_DIR, "jobs")
+MAX_CONCURRENT_JOBS = int(os.getenv("SHORTIFY_MAX_JOBS", "2"))
+# Jobs allowed to wait for a worker before submit() refuses more
+MAX_QUEUED_JOBS = int(os.getenv("SHORTIFY_MAX_QUEUED_JOBS", "32"))
+JOB_RETENTION_SECONDS = int(os.getenv("SHORTIFY_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+MAX_KEPT_JOBS = int(os.getenv("SHORTIFY_MAX_KEPT_JOBS", "500"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when the job queue is at capacity."""
+
+
+@dataclass
+class Job:
+    id: str
+    video_path: str
+    digest: str
+    options: dict
+    state: str = QUEUED
+    # stage name -> "pending" | "started" | "done" | "failed"
+    stages: dict = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    error: str = None
+    transcription: str = None
+    highlights: list = None
+    clips: list = None
+    report: dict = None
+    # Bumped on every change, for callers waiting on updates
+    version: int = 0
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def progress(self):
+        """Fraction of this job's stages that have finished."""
+        if self.state == DONE:
+            return 1.0
+        if not self.stages:
+            return 0.0
+        return sum(state == "done" for state in self.stages.values()) / len(self.stages)
+
+    def to_dict(self):
+        return {**asdict(self), "progress": self.progress}
+
+
+class JobManager:
+    def __init__(self, root=JOBS_DIR, max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 retention=JOB_RETENTION_SECONDS, max_kept=MAX_KEPT_JOBS):
+        self.root = root
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.max_kept = max_kept
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs = self._load()
+        self._tokens = {}
+        self._futures = {}
+        # Scratch workspace holding each unfinished job's video, pinned until the job finishes
+        self._pins = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        with self._lock:
+            self._prune()
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _load(self):
+        jobs = {}
+        if not os.path.isdir(self.root):
+            return jobs
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                data.pop("progress", None)
+                job = Job(**data)
+            except (OSError, ValueError, TypeError):
+                continue
+            if not job.finished:
+                # The process that ran it is gone
+                job.state = FAILED
+                job.error = "Interrupted by a restart"
+                job.finished_at = time.time()
+            jobs[job.id] = job
+        return jobs
+
+    def _save(self, job):
+        """Write `job` to disk atomically. Caller holds the lock."""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._path(job.id))
+
+    def _prune(self):
+        """Forget finished jobs older than `retention` or beyond the newest `max_kept`. Caller holds the lock."""
+        finished = sorted((job for job in self._jobs.values() if job.finished),
+                          key=lambda job: job.finished_at or job.created_at, reverse=True)
+        cutoff = time.time() - self.retention
+        for i, job in enumerate(finished):
+            if i >= self.max_kept or (job.finished_at or job.created_at) < cutoff:
+                del self._jobs[job.id]
+                try:
+                    os.remove(self._path(job.id))
+                except OSError:
+                    pass
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._save(job)
+            self._changed.notify_all()
+
+    def _set_stage(self, job_id, stage, state):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.stages = {**job.stages, stage: state}
+            job.version += 1
+            self._save(job)
+            self._changed.notify_all()
+
+    def submit(self, video_path, digest=None, options=None):
+        """Queue the pipeline for `video_path` and return the new job's id.
+
+        Raises QueueFull when max_workers jobs are running and max_queued more
+        are already waiting.
+        """
+        digest = digest or file_digest(video_path)
+        options = options or PipelineOptions()
+        with self._lock:
+            self._prune()
+            active = sum(not job.finished for job in self._jobs.values())
+            if active >= self.max_workers + self.max_queued:
+                raise QueueFull(f"{active} jobs already queued or running")
+            job = Job(uuid.uuid4().hex[:12], str(video_path), digest, asdict(options))
+            self._jobs[job.id] = job
+            self._tokens[job.id] = CancelToken()
+            # Keep an uploaded video from being evicted while the job waits in the queue
+            workspaces = get_workspace_manager()
+            pinned = workspaces.owner(job.video_path)
+            if pinned:
+                workspaces.acquire(pinned)
+                self._pins[job.id] = pinned
+            self._save(job)
+            self._futures[job.id] = self._pool.submit(self._run, job.id)
+        print(f"Job {job.id} queued ✅")
+        return job.id
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            token = self._tokens[job_id]
+            if job.finished:
+                return
+        self._update(job_id, state=RUNNING, started_at=time.time())
+
+        def progress(stage, state):
+            if state == "started":
+                # Stop before starting more work once the job is cancelled
+                token.check()
+            self._set_stage(job_id, stage, state)
+
+        report = None
+        try:
+            with cancel_scope(token):
+                values, report = run_pipeline(job.video_path, job.digest, PipelineOptions(**job.options), progress=progress,
+                                              workspace_name=f"job-{job_id}")
+            state, error = DONE, None
+        except StageError as e:
+            values, report = e.values, e.report
+            state, error = (CANCELLED, "Cancelled") if token.cancelled else (FAILED, str(e))
+        except Exception as e:
+            values = {}
+            state, error = (CANCELLED, "Cancelled") if token.cancelled else (FAILED, str(e))
+
+        highlights = values.get("highlights")
+        self._update(
+            job_id, state=state, error=error, finished_at=time.time(),
+            transcription=values.get("transcription"),
+            highlights=highlights if isinstance(highlights, list) else None,
+            clips=values.get("clips"),
+            report=report.as_dict() if report is not None else None,
+        )
+        with self._lock:
+            self._tokens.pop(job_id, None)
+            self._futures.pop(job_id, None)
+        self._unpin(job_id)
+        print(f"Job {job_id} {state} ✅")
+
+    def _unpin(self, job_id):
+        with self._lock:
+            pinned = self._pins.pop(job_id, None)
+        if pinned:
+            get_workspace_manager().release(pinned)
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if there is no such job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job, stages=dict(job.stages)) if job else None
+
+    def list_jobs(self):
+        """Snapshots of every known job, newest first."""
+        with self._lock:
+            jobs = [replace(job, stages=dict(job.stages)) for job in self._jobs.values()]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def wait(self, job_id, version=-1, timeout=None):
+        """Block until the job changes past `version` (or finishes, or `timeout` passes); return a snapshot."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id].version > version or self._jobs[job_id].finished,
+                timeout=timeout,
+            )
+        return self.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns False if it had already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            token = self._tokens.get(job_id)
+            future = self._futures.get(job_id)
+            queued = job.state == QUEUED and future is not None and future.cancel()
+        if token is not None:
+            token.cancel()
+        if queued:
+            self._update(job_id, state=CANCELLED, error="Cancelled", finished_at=time.time())
+            self._unpin(job_id)
+        print(f"Job {job_id} cancelling...")
+        return True
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
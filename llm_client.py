@@ -0,0 +1,381 @@
+"""Shared LLM client used by every Gemini call in Shortify.
+
+One process-wide client owns:
+
+* reused model handles (one `GenerativeModel` per model name)
+* a semaphore bounding the number of in-flight requests
+* exponential-backoff retries on rate-limit and transient server errors
+* per-call latency and token accounting
+* streamed generation for callers that can act on partial output
+* reuse of uploaded files by content hash (see file_registry)
+* a swappable backend: "gemini" for the real API, or "stub", a deterministic
+  local stand-in that returns canned transcripts and highlights so the whole
+  pipeline can be load-tested and benchmarked offline
+
+Pick the backend with SHORTIFY_LLM_BACKEND=gemini|stub, and tune the client
+with SHORTIFY_LLM_MAX_INFLIGHT, SHORTIFY_LLM_TIMEOUT and SHORTIFY_LLM_MAX_RETRIES.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+DEFAULT_MODEL = "models/gemini-1.5-pro-latest"
+
+DEFAULT_BACKEND = "gemini"
+# Defaults for the SHORTIFY_LLM_* settings, which are read when the client is created
+MAX_INFLIGHT = 4
+REQUEST_TIMEOUT = 600.0
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+# How many individual call records to keep; totals are kept for every call
+MAX_CALL_RECORDS = 1000
+
+# google.api_core exception names worth retrying, matched by name so this
+# module doesn't need google-api-core at import time
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+}
+
+
+# HTTP statuses worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """True for rate-limit (429) and transient server errors.
+
+    Goes by the exception type or its HTTP status (`code` on google-api-core
+    and google-genai errors, `status_code` elsewhere), never by the message.
+    """
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):
+        status = getattr(error, "status_code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS_CODES
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class CallRecord:
+    """Accounting for one completed (or failed) LLM call."""
+    model: str
+    kind: str
+    latency: float
+    attempts: int
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    error: str = None
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.genai = genai
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = self.genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def upload_file(self, path):
+        return self.genai.upload_file(path=path)
+
+    def get_file(self, name):
+        return self.genai.get_file(name)
+
+    def delete_file(self, name):
+        self.genai.delete_file(name)
+
+    def generate(self, model_name, contents, timeout):
+        response = self.model(model_name).generate_content(contents, request_options={"timeout": timeout})
+        return _gemini_response(response)
+
+    def generate_stream(self, model_name, contents, timeout):
+        response = self.model(model_name).generate_content(contents, stream=True, request_options={"timeout": timeout})
+        for chunk in response:
+            yield _gemini_response(chunk)
+
+
+def _gemini_response(response):
+    usage = getattr(response, "usage_metadata", None)
+    try:
+        text = response.text
+    except ValueError:
+        # Stream chunks that only carry a finish reason have no text parts
+        text = ""
+    return LLMResponse(
+        text,
+        prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+        output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+    )
+
+
+@dataclass
+class StubFile:
+    """Stand-in for an uploaded Gemini file."""
+    path: str
+    name: str = field(default="")
+
+
+class StubBackend:
+    """Deterministic offline backend.
+
+    Requests that carry an uploaded file get a canned transcript; text-only
+    prompts mentioning highlights get three evenly spaced highlights that fit
+    inside the duration quoted in the prompt. SHORTIFY_STUB_LATENCY adds a fixed
+    delay per call for benchmarking; streamed calls spread it over their chunks.
+    """
+    name = "stub"
+
+    SENTENCES = [
+        "Welcome everyone and thanks for joining this talk",
+        "Today we are going to look at how the system works",
+        "The first idea is to keep every stage simple",
+        "Here is the part that surprised us the most",
+        "We measured it and the numbers were clear",
+        "That is the main takeaway for today",
+    ]
+    SEGMENT_SECONDS = 5
+    TRANSCRIPT_SECONDS = 60
+    STREAM_CHUNK_CHARS = 64
+
+    def __init__(self):
+        self.latency = float(os.getenv("SHORTIFY_STUB_LATENCY", "0"))
+
+    def upload_file(self, path):
+        return StubFile(path, name=f"files/stub-{os.path.basename(path)}")
+
+    def get_file(self, name):
+        return StubFile(name, name=name)
+
+    def delete_file(self, name):
+        pass
+
+    def generate(self, model_name, contents, timeout):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(contents)
+
+    def generate_stream(self, model_name, contents, timeout):
+        response = self._respond(contents)
+        text = response.text
+        pieces = [text[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(text), self.STREAM_CHUNK_CHARS)]
+        for i, piece in enumerate(pieces):
+            if self.latency:
+                time.sleep(self.latency / len(pieces))
+            last = i == len(pieces) - 1
+            yield LLMResponse(piece, response.prompt_tokens if last else 0, response.output_tokens if last else 0)
+
+    def _respond(self, contents):
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        prompt = " ".join(p for p in parts if isinstance(p, str))
+        if any(isinstance(p, StubFile) for p in parts):
+            text = self._transcript()
+        elif "highlight" in prompt.lower():
+            text = self._highlights(prompt)
+        else:
+            text = "Stub summary:\n" + "\n".join(f"- {s}" for s in self.SENTENCES[:3])
+        return LLMResponse(text, prompt_tokens=len(prompt.split()), output_tokens=len(text.split()))
+
+    def _transcript(self):
+        segments = []
+        for i, start in enumerate(range(0, self.TRANSCRIPT_SECONDS, self.SEGMENT_SECONDS)):
+            segments.append({
+                "text": self.SENTENCES[i % len(self.SENTENCES)],
+                "start": _hms(start),
+                "end": _hms(start + self.SEGMENT_SECONDS),
+            })
+        return json.dumps(segments, indent=2)
+
+    def _highlights(self, prompt):
+        match = re.search(r"total duration of video\s*=\s*(\d+(?:\.\d+)?)", prompt)
+        duration = float(match.group(1)) if match else float(self.TRANSCRIPT_SECONDS)
+        slot = duration / 3
+        length = max(1.0, min(20.0, slot - 1))
+        highlights = []
+        for i in range(3):
+            start = int(i * slot)
+            end = int(min(start + length, duration - 1))
+            highlights.append({
+                "start": _hms(start),
+                "highlight": f"Highlight {i + 1}",
+                "transcript": " ".join(self.SENTENCES[i * 2:i * 2 + 2]),
+                "end": _hms(max(end, start + 1)),
+            })
+        return "```json\n" + json.dumps(highlights, indent=2) + "\n```"
+
+
+def _hms(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+class LLMClient:
+    """Thread-safe front end: concurrency limit, retries and accounting around a backend."""
+
+    def __init__(self, backend, max_inflight=MAX_INFLIGHT, timeout=REQUEST_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._inflight = threading.BoundedSemaphore(max_inflight)
+        self._records_lock = threading.Lock()
+        self.records = deque(maxlen=MAX_CALL_RECORDS)
+        self._totals = {}
+        self._registry = None
+
+    def _call(self, kind, model_name, fn):
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self._inflight:
+                    result = fn()
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable(e):
+                    delay = min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+                    print(f"LLM {kind} rate limited ({e}), retrying in {delay:.0f}s...")
+                    time.sleep(delay)
+                    continue
+                self._record(CallRecord(model_name, kind, time.perf_counter() - start, attempt, error=str(e)))
+                raise
+            record = CallRecord(model_name, kind, time.perf_counter() - start, attempt)
+            if isinstance(result, LLMResponse):
+                record.prompt_tokens = result.prompt_tokens
+                record.output_tokens = result.output_tokens
+            self._record(record)
+            return result
+
+    def _record(self, record):
+        with self._records_lock:
+            self.records.append(record)
+            entry = self._totals.setdefault(record.kind, {
+                "calls": 0, "errors": 0, "latency": 0.0, "prompt_tokens": 0, "output_tokens": 0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += record.error is not None
+            entry["latency"] += record.latency
+            entry["prompt_tokens"] += record.prompt_tokens
+            entry["output_tokens"] += record.output_tokens
+
+    def generate(self, contents, model=DEFAULT_MODEL, kind="generate"):
+        """Run one generate_content call and return an LLMResponse."""
+        return self._call(kind, model, lambda: self.backend.generate(model, contents, self.timeout))
+
+    def generate_stream(self, contents, model=DEFAULT_MODEL, kind="generate"):
+        """Run one streamed generate_content call, yielding text chunks as they arrive.
+
+        Rate limits are retried only until the first chunk has been yielded;
+        after that a failure is raised to the caller. The in-flight slot is held
+        only while waiting on the model for the next chunk, not while the caller
+        works on the last one (e.g. renders the highlight it completed).
+        """
+        start = time.perf_counter()
+        record = CallRecord(model, kind, 0.0, 0)
+        while True:
+            record.attempts += 1
+            streamed = False
+            try:
+                chunks = iter(self.backend.generate_stream(model, contents, self.timeout))
+                while True:
+                    with self._inflight:
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    # Usage is cumulative, the last chunk carries the totals
+                    record.prompt_tokens = max(record.prompt_tokens, chunk.prompt_tokens)
+                    record.output_tokens = max(record.output_tokens, chunk.output_tokens)
+                    if chunk.text:
+                        streamed = True
+                        yield chunk.text
+                break
+            except Exception as e:
+                if not streamed and record.attempts < self.max_retries and is_retryable(e):
+                    delay = min(self.backoff * 2 ** (record.attempts - 1), MAX_BACKOFF_SECONDS)
+                    print(f"LLM {kind} rate limited ({e}), retrying in {delay:.0f}s...")
+                    time.sleep(delay)
+                    continue
+                record.latency = time.perf_counter() - start
+                record.error = str(e)
+                self._record(record)
+                raise
+        record.latency = time.perf_counter() - start
+        self._record(record)
+
+    @property
+    def registry(self):
+        if self._registry is None:
+            from file_registry import RemoteFileRegistry
+            self._registry = RemoteFileRegistry(self.backend)
+        return self._registry
+
+    def upload_file(self, path, digest=None, reuse=True):
+        """Upload a file for use in a later generate() call.
+
+        With `reuse`, a still-valid earlier upload of the same content is
+        returned instead of uploading again.
+        """
+        def upload(file_path):
+            return self._call("upload", None, lambda: self.backend.upload_file(file_path))
+
+        if not reuse:
+            return upload(path)
+        return self.registry.upload(path, upload, digest=digest)
+
+    def summary(self):
+        """Call count, errors, total latency and tokens per call kind."""
+        with self._records_lock:
+            return {kind: dict(entry) for kind, entry in self._totals.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide LLM client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Read at first use rather than import, so a .env loaded by the caller applies
+            backend_name = os.getenv("SHORTIFY_LLM_BACKEND", DEFAULT_BACKEND)
+            if backend_name not in BACKENDS:
+                raise ValueError(f"Unknown LLM backend '{backend_name}', expected one of {sorted(BACKENDS)}")
+            _client = LLMClient(
+                BACKENDS[backend_name](),
+                max_inflight=int(os.getenv("SHORTIFY_LLM_MAX_INFLIGHT", str(MAX_INFLIGHT))),
+                timeout=float(os.getenv("SHORTIFY_LLM_TIMEOUT", str(REQUEST_TIMEOUT))),
+                max_retries=int(os.getenv("SHORTIFY_LLM_MAX_RETRIES", str(MAX_RETRIES))),
+            )
+        return _client
+
+
+def set_client(client):
+    """Swap the process-wide client, e.g. for a stub backend in tests."""
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,217 @@
+"""Content-addressed on-disk cache for pipeline stage results.
+
+Keys are built from the source video's content hash plus everything that
+affects a stage's output (model name, prompt text, render settings), so a
+repeat upload of the same talk reuses its audio, transcript, highlights and
+rendered shorts. Each entry is a directory holding either a JSON value or a
+set of files. Total size is capped and the least recently used entries are
+evicted first.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+CACHE_DIR = os.getenv("SHORTIFY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "shortify"))
+CACHE_MAX_BYTES = int(os.getenv("SHORTIFY_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_with_digest(buffer, out_file, chunk_size=HASH_CHUNK_SIZE):
+    """Write a bytes-like buffer to `out_file` in chunks and return its sha256 hex digest.
+
+    Slices a memoryview, so the source is never copied whole.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(buffer)
+    try:
+        for offset in range(0, len(view), chunk_size):
+            chunk = view[offset:offset + chunk_size]
+            out_file.write(chunk)
+            digest.update(chunk)
+    finally:
+        view.release()
+    return digest.hexdigest()
+
+
+def copy_with_digest(src, out_file, length, chunk_size=HASH_CHUNK_SIZE):
+    """Copy exactly `length` bytes from file-like `src` to `out_file` and return their sha256 hex digest.
+
+    Raises EOFError if `src` ends early.
+    """
+    digest = hashlib.sha256()
+    remaining = length
+    while remaining > 0:
+        chunk = src.read(min(chunk_size, remaining))
+        if not chunk:
+            raise EOFError(f"Stream ended {remaining} bytes short")
+        out_file.write(chunk)
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """Build a cache key from any JSON-serialisable parts."""
+    blob = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class MediaCache:
+    """A size-capped, LRU-evicted directory of cache entries."""
+
+    VALUE_FILE = "value.json"
+    FILES_FILE = "files.json"
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _touch(self, entry_dir):
+        # Entry directory mtime doubles as the LRU clock
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+
+    def get_json(self, key):
+        """Return the cached JSON value for `key`, or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, self.VALUE_FILE), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(entry_dir)
+        return value
+
+    def put_json(self, key, value):
+        """Store a JSON-serialisable value under `key`."""
+        def write(tmp_dir):
+            with open(os.path.join(tmp_dir, self.VALUE_FILE), "w", encoding="utf-8") as f:
+                json.dump(value, f)
+        self._commit(key, write)
+
+    def get_files(self, key):
+        """Return the cached file paths for `key` in stored order, or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, self.FILES_FILE), "r", encoding="utf-8") as f:
+                names = json.load(f)
+        except (OSError, ValueError):
+            return None
+        paths = [os.path.join(entry_dir, name) for name in names]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        self._touch(entry_dir)
+        return paths
+
+    def put_files(self, key, paths, move=False):
+        """Copy `paths` into the cache under `key` and return the cached copies.
+
+        With `move` the files are moved instead, for scratch files nothing else needs.
+        """
+        names = []
+
+        def write(tmp_dir):
+            for i, path in enumerate(paths):
+                name = f"{i}{os.path.splitext(path)[1]}"
+                if move:
+                    shutil.move(path, os.path.join(tmp_dir, name))
+                else:
+                    shutil.copyfile(path, os.path.join(tmp_dir, name))
+                names.append(name)
+            with open(os.path.join(tmp_dir, self.FILES_FILE), "w", encoding="utf-8") as f:
+                json.dump(names, f)
+
+        entry_dir = self._commit(key, write)
+        return [os.path.join(entry_dir, name) for name in names]
+
+    def _commit(self, key, write):
+        """Build an entry in a scratch dir, then rename it into place atomically.
+
+        A complete entry already committed under `key` is kept and the new one
+        discarded: its files may be being read or served right now, and the key
+        says they hold the same thing. An incomplete one is swapped out by rename,
+        so readers that already opened its files can finish.
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            write(tmp_dir)
+            with self._lock:
+                if os.path.isdir(entry_dir) and not all(
+                        os.path.exists(os.path.join(entry_dir, name)) for name in os.listdir(tmp_dir)):
+                    stale_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+                    os.replace(entry_dir, os.path.join(stale_dir, "entry"))
+                    shutil.rmtree(stale_dir, ignore_errors=True)
+                if not os.path.isdir(entry_dir):
+                    try:
+                        os.replace(tmp_dir, entry_dir)
+                    except OSError:
+                        # Another process committed the same key first, keep theirs
+                        pass
+                self._touch(entry_dir)
+                self._evict(keep=entry_dir)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return entry_dir
+
+    def _entries(self):
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name.startswith(".tmp-"):
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_dir():
+                    yield entry.path
+
+    def _evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry_dir in self._entries():
+            size = sum(f.stat().st_size for f in os.scandir(entry_dir) if f.is_file())
+            entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+            total += size
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Return the process-wide cache instance."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MediaCache()
+    return _default_cache
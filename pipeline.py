@@ -0,0 +1,493 @@
+"""The Shortify pipeline: video in, transcript, highlights and rendered shorts out.
+
+These are the processing steps behind the Streamlit page, free of any UI code
+so other entry points can drive them too. `run_pipeline` wires them into a
+stage graph (see stage_scheduler): probing the video runs alongside audio
+extraction and transcription, and every stage checks the media cache first.
+"""
+import contextvars
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from audio_extract import DEFAULT_UPLOAD_TARGET, extract_audio
+from captions import clean_caption
+from chunked_transcription import transcribe_chunked
+from fast_cut import fast_cut
+from ffmpeg_utils import probe_video_info
+from highlight_stream import iter_highlights
+from llm_client import DEFAULT_MODEL, get_client
+from media_cache import cache_key, get_cache
+from reframe import crop_offsets
+from render_engine import RENDER_VERSION, ClipSpec, crop_bounds, render_clips, render_clips_parallel
+from scene_index import CUT_THRESHOLD, SCENE_INDEX_VERSION, SNAP_TOLERANCE_SECONDS, SceneIndex, build_scene_index
+from stage_scheduler import Stage, run_stages
+from timeparse import parse_seconds
+from transcript_store import TranscriptStore
+from whisper_pool import DEFAULT_MODEL_SIZE, transcribe_with_whisper
+from workspace import get_workspace_manager, workspace_scope
+
+GEMINI_MODEL = DEFAULT_MODEL
+WHISPER_MODEL = DEFAULT_MODEL_SIZE
+
+# UI label -> (backend, model, audio target the backend wants)
+TRANSCRIPTION_BACKENDS = {
+    "Gemini": ("gemini", GEMINI_MODEL, DEFAULT_UPLOAD_TARGET),
+    "Local (faster-whisper)": ("whisper", WHISPER_MODEL, "pcm16k"),
+}
+
+transcribe_prompt = '''
+Please transcribe the following audio and provide the transcription in JSON format. 
+The JSON should include each segment of text with its corresponding start and end timestamps. 
+The start and end time stamp should all be correct and always less than the total length of audio.[important] start and end time can enver exceed length of audio clip given to you.
+Each entry in the JSON should have the following structure: I want only the json nothing else.
+{ "text": "Transcribed text here", "start": "Start timestamp", "end": "End timestamp" }
+Don't print anything else.
+'''
+
+highlight_system_prompt = '''
+Based on the transcription provided by the user with start and end times, I want three highlights of less than 30 seconds each. 
+Each highlight should be continuous, interesting, and non-overlapping. Provide the timestamps for the start and end of each clip.
+
+If any end time is more than the length of the clip, adjust it to be one second less than the total length of the clip. 
+If the clip is too short, distribute the highlights equally across the duration of the video.
+
+Follow this format and return valid JSON SCHEMA:
+[
+  {
+    "start": "Start time of the first clip in HH:MM:SS format",
+    "highlight": "Highlight text for the first clip",
+    "end": "End time of the first clip in HH:MM:SS format"
+  },
+  {
+    "start": "Start time of the second clip in HH:MM:SS format",
+    "highlight": "Highlight text for the second clip",
+    "end": "End time of the second clip in HH:MM:SS format"
+  },
+  {
+    "start": "Start time of the third clip in HH:MM:SS format",
+    "highlight": "Highlight text for the third clip",
+    "end": "End time of the third clip in HH:MM:SS format"
+  }
+]
+
+Don't say anything else, just return proper JSON. No explanation.
+'''
+
+
+def probe_video(video_path):
+    """Return {"duration", "width", "height", "fps"} from the container headers.
+
+    Uses ffprobe when it is installed and falls back to OpenCV's metadata.
+    """
+    info = probe_video_info(video_path)
+    if info is not None:
+        return info
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise RuntimeError(f"Cannot open video {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return {
+            "duration": cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": fps,
+        }
+    finally:
+        cap.release()
+
+
+def attach_transcripts(highlight_json, transcript_store):
+    """Fill each highlight's "transcript" from the local transcript instead of asking the model to repeat it."""
+    for highlight in highlight_json:
+        try:
+            highlight["transcript"] = transcript_store.slice_text(parse_seconds(highlight["start"]), parse_seconds(highlight["end"]))
+        except (KeyError, ValueError):
+            highlight.setdefault("transcript", "")
+    return highlight_json
+
+
+def extract_audio_from_video(video_file_path, target=DEFAULT_UPLOAD_TARGET):
+    try:
+        # Compact mono speech audio, a fraction of the size of a full-rate WAV
+        audio_file_path = extract_audio(video_file_path, target=target)
+        return audio_file_path
+    except Exception as e:
+        print(f"Error extracting audio from video: {e}")
+        return None
+
+
+def transcribe_audio_file(audio_file_path):
+    """Send one audio file to Gemini and return the raw transcription text."""
+    client = get_client()
+    audio_file = client.upload_file(audio_file_path)
+    response = client.generate(
+    [
+        transcribe_prompt,
+        audio_file
+    ],
+    model=GEMINI_MODEL, kind="transcribe"
+    )
+    return response.text
+
+
+def transcribe_audio(audio_file_path, backend="gemini", chunked=True):
+    try:
+        print("Transcribing started...")
+        if backend == "whisper":
+            # Local CPU/GPU transcription, no upload or remote queue
+            segments = transcribe_with_whisper(audio_file_path, size=WHISPER_MODEL)
+            transcription = json.dumps(segments, indent=2)
+        elif chunked:
+            # Split long audio at pauses and transcribe the pieces concurrently
+            segments = transcribe_chunked(audio_file_path, transcribe_audio_file)
+            transcription = json.dumps(segments, indent=2)
+        else:
+            transcription = transcribe_audio_file(audio_file_path)
+        print("Transcribing Completed✅")
+        return transcription
+    except Exception as e:
+        print(f"Transcription Error: {e}")
+        return ""
+
+
+def highlight_prompt(transcription, duration):
+    return "highlight_system_prompt="+highlight_system_prompt+" AND transcription="+transcription+"Also note that the start and end time should not exceed the total duration of video ="+str(duration)+".If you only when it exceeds then take the middle 25 to 30s of the clip and put it as start and end time. Don't forget to do this."
+
+
+def stream_highlights(transcription, duration):
+    """Yield validated highlights one by one while the model is still writing the rest."""
+    print("highlighting started (streaming)...")
+    chunks = get_client().generate_stream(highlight_prompt(transcription, duration), model=GEMINI_MODEL, kind="highlights")
+    for highlight in iter_highlights(chunks):
+        print(f"Highlight received: {highlight['start']} - {highlight['end']} ✅")
+        yield highlight
+    print("Highlighting Completed✅")
+
+
+def generate_highlights(video_file, transcription, duration=None):
+    try:
+        print("highlighting started...")
+        if duration is None:
+            duration = probe_video(video_file)["duration"]
+        response = get_client().generate(highlight_prompt(transcription, duration), model=GEMINI_MODEL, kind="highlights")
+        highlight_response = response.text.strip()
+        print(highlight_response)
+        print("Highlighting Completed✅")
+        if not highlight_response:
+            print("Error: The json is empty.")
+            return "none"
+        try:
+            # Parse the string as JSON
+            print("parsing json...")
+            json_string = highlight_response.replace("json", "")
+            json_string = json_string.replace("```", "")
+            data_json = json.loads(json_string)
+            print(data_json)
+            return data_json
+
+        except json.JSONDecodeError as e:
+            print(f"JSON Decode Error: {e}")
+            return "none"
+
+    except Exception as e:
+        print(f"Error generating highlights: {e}")
+        return "none"
+
+
+def clip_spec_for(highlight, total_duration, transcript_store=None, scene_index=None):
+    """Turn one highlight into a ClipSpec, keeping it inside the video and snapping its edges to nearby cuts."""
+    start_time = parse_seconds(highlight["start"])
+    end_time = parse_seconds(highlight["end"])
+    print("Got the start and end time ✅")
+    print(start_time)
+    print(end_time)
+    if(start_time>=total_duration):
+        start_time=total_duration/3
+        end_time=start_time+20
+    if(end_time>=total_duration):
+        start_time=total_duration/3
+        end_time=start_time+20
+    if scene_index is not None:
+        start_time, end_time = scene_index.snap(start_time, end_time)
+        end_time = min(end_time, total_duration)
+
+    # Captions timed from the local transcript's word timestamps when we have one
+    if transcript_store is not None and len(transcript_store):
+        captions = [
+            (word_start, word_end, clean_caption(word))
+            for word_start, word_end, word in transcript_store.words(start_time, end_time)
+        ]
+        return ClipSpec(start_time, end_time, captions=[c for c in captions if c[2]])
+    transcript = highlight.get("transcript", "")
+    cleaned_transcript = re.sub(r"[^\w\s]", "", transcript)
+    words = cleaned_transcript.split()
+    return ClipSpec(start_time, end_time, words)
+
+
+def crop_box_for(video_file, video_info, clip_spec, reframe=False):
+    """The (x1, x2) 9:16 crop for a clip cut without captions: centered, or where the speaker mostly is."""
+    width, height = video_info["width"], video_info["height"]
+    x1, x2 = crop_bounds(width, height)
+    if reframe:
+        fps = video_info.get("fps") or 30.0
+        try:
+            offsets = crop_offsets(video_file, clip_spec.start, fps, int(round((clip_spec.end - clip_spec.start) * fps)),
+                                   (width, height), x2 - x1)
+        except Exception as e:
+            print(f"Subject tracking failed, using a centered crop: {e}")
+            offsets = None
+        if offsets is not None:
+            # ffmpeg's crop is fixed for the whole cut, so sit where the speaker spends most time
+            x1, x2 = int(np.median(offsets)), int(np.median(offsets)) + x2 - x1
+    return x1, x2
+
+
+def process_video(video_file, highlight_json, transcript_store=None, parallel=False, burn_captions=True, crop=True, video_info=None,
+                  reframe=False, scene_index=None):
+    try:
+        video_info = video_info or probe_video(video_file)
+        total_duration = video_info["duration"]
+        # Parse every highlight up front so the source only has to be decoded once
+        clip_specs = [clip_spec_for(highlight, total_duration, transcript_store, scene_index) for highlight in highlight_json]
+
+        if not burn_captions:
+            # No per-frame changes needed, cut straight from the source
+            video_clips = [
+                fast_cut(video_file, clip_spec.start, clip_spec.end, accurate=True,
+                         crop=crop_box_for(video_file, video_info, clip_spec, reframe) if crop else None)
+                for clip_spec in clip_specs
+            ]
+        else:
+            if parallel:
+                # One worker process per highlight
+                results = render_clips_parallel(video_file, clip_specs, reframe=reframe)
+            else:
+                # Crop, caption and encode all highlights in a single decode pass
+                results = render_clips(video_file, clip_specs, reframe=reframe)
+            # Either way a bad clip doesn't sink the others
+            for result in results:
+                if result.error:
+                    print(f"Error rendering clip {result.index + 1}: {result.error}")
+            video_clips = [result.path for result in results if result.path]
+        print("Rendered highlights ✅")
+        return video_clips
+
+    except Exception as e:
+        print(f"Error processing video: {e}")
+        return None
+
+
+def process_video_streaming(video_file, transcription, transcript_store=None, burn_captions=True, crop=True, video_info=None,
+                            reframe=False, scene_index=None):
+    """Stream highlights from the model and start rendering each one as soon as it arrives.
+
+    Returns (highlights, clip paths); the paths are None if rendering failed.
+    """
+    highlight_json = []
+    try:
+        video_info = video_info or probe_video(video_file)
+        total_duration = video_info["duration"]
+
+        def clip_specs():
+            for highlight in stream_highlights(transcription, total_duration):
+                if transcript_store is not None:
+                    attach_transcripts([highlight], transcript_store)
+                highlight_json.append(highlight)
+                yield clip_spec_for(highlight, total_duration, transcript_store, scene_index)
+
+        if not burn_captions:
+            def cut(clip_spec):
+                crop_box = crop_box_for(video_file, video_info, clip_spec, reframe) if crop else None
+                return fast_cut(video_file, clip_spec.start, clip_spec.end, crop=crop_box, accurate=True)
+
+            # Cuts are ffmpeg subprocesses, threads are enough to overlap them
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, cut, clip_spec) for clip_spec in clip_specs()]
+                video_clips = [future.result() for future in futures]
+        else:
+            results = render_clips_parallel(video_file, clip_specs(), reframe=reframe)
+            for result in results:
+                if result.error:
+                    print(f"Error rendering clip {result.index + 1}: {result.error}")
+            video_clips = [result.path for result in results if result.path]
+        print("Rendered highlights ✅")
+        return highlight_json, video_clips
+
+    except Exception as e:
+        print(f"Error processing video: {e}")
+        return highlight_json, None
+
+
+@dataclass
+class PipelineOptions:
+    transcription_backend: str = "Gemini"
+    burn_captions: bool = True
+    crop: bool = True
+    # Follow the speaker with the 9:16 crop instead of keeping it centered
+    reframe: bool = True
+    # Move highlight edges onto nearby scene cuts
+    snap_to_cuts: bool = True
+    parallel: bool = True
+    # Start rendering each highlight as it streams in; needs per-clip rendering
+    stream: bool = True
+
+
+def transcript_cache_key(digest, options):
+    backend, transcription_model, audio_target = TRANSCRIPTION_BACKENDS[options.transcription_backend]
+    return cache_key("transcript", digest, backend, audio_target, transcription_model, transcribe_prompt, "chunked")
+
+
+def highlights_cache_key(digest, transcription):
+    return cache_key("highlights", digest, GEMINI_MODEL, highlight_system_prompt, transcription)
+
+
+# Every stage build_stages can produce; "highlights+render" replaces the separate
+# "highlights" and "render" stages when streaming
+STAGE_NAMES = (
+    "probe", "scenes", "extract_audio", "transcribe", "transcript_store",
+    "highlights", "render", "highlights+render",
+)
+
+
+def build_stages(options, stream=False):
+    """The pipeline as a stage graph.
+
+    Seed values are "video_path" and "digest". Outputs are "video_info",
+    "scene_index", "transcription", "transcript_store", "highlights" and
+    "clips". The scene index is built while the audio is transcribed. With
+    `stream`, highlight generation and rendering are one stage that renders
+    each highlight as it arrives.
+    """
+    cache = get_cache()
+    backend, _, audio_target = TRANSCRIPTION_BACKENDS[options.transcription_backend]
+    render_settings = {"version": RENDER_VERSION, "burn_captions": options.burn_captions, "crop": options.crop,
+                       "reframe": options.reframe,
+                       "snap": [SCENE_INDEX_VERSION, CUT_THRESHOLD, SNAP_TOLERANCE_SECONDS] if options.snap_to_cuts else None}
+
+    def scenes(video_path, video_info, digest):
+        if not options.snap_to_cuts:
+            return None
+        scenes_key = cache_key("scenes", digest, SCENE_INDEX_VERSION, CUT_THRESHOLD)
+        cached_scenes = cache.get_json(scenes_key)
+        if cached_scenes is not None:
+            print("Scene index cache hit ✅")
+            return SceneIndex.from_dict(cached_scenes)
+        scene_index = build_scene_index(video_path, video_info.get("fps") or 30.0, video_info["duration"])
+        cache.put_json(scenes_key, scene_index.to_dict())
+        return scene_index
+
+    def audio(video_path, digest):
+        audio_key = cache_key("audio", digest, audio_target)
+        cached_audio = cache.get_files(audio_key)
+        if cached_audio:
+            return cached_audio[0]
+        audio_path = extract_audio_from_video(video_path, target=audio_target)
+        if not audio_path:
+            raise RuntimeError("Audio extraction failed")
+        cache.put_files(audio_key, [audio_path])
+        return audio_path
+
+    def transcribe(audio_path, digest):
+        transcription = transcribe_audio(audio_path, backend=backend)
+        if not transcription:
+            raise RuntimeError("Transcription failed")
+        cache.put_json(transcript_cache_key(digest, options), transcription)
+        return transcription
+
+    def highlights(video_info, transcription, digest):
+        highlight_json = generate_highlights(None, transcription, duration=video_info["duration"])
+        if highlight_json == "none":
+            raise RuntimeError("Highlight generation failed")
+        cache.put_json(highlights_cache_key(digest, transcription), highlight_json)
+        return highlight_json
+
+    def render(video_path, video_info, highlights, transcript_store, scene_index, digest):
+        highlight_json = attach_transcripts(highlights, transcript_store)
+        render_key = cache_key("render", digest, highlight_json, render_settings)
+        clips = cache.get_files(render_key)
+        if clips is not None:
+            print("Render cache hit ✅")
+            return clips
+        clips = process_video(
+            video_path, highlight_json, transcript_store=transcript_store, parallel=options.parallel,
+            burn_captions=options.burn_captions, crop=options.crop, video_info=video_info, reframe=options.reframe,
+            scene_index=scene_index,
+        )
+        if not clips:
+            raise RuntimeError("Failed to process the video")
+        # The rendered files are only scratch, keep just the cached copies
+        return cache.put_files(render_key, clips, move=True)
+
+    def stream_render(video_path, video_info, transcription, transcript_store, scene_index, digest):
+        highlight_json, clips = process_video_streaming(
+            video_path, transcription, transcript_store=transcript_store,
+            burn_captions=options.burn_captions, crop=options.crop, video_info=video_info, reframe=options.reframe,
+            scene_index=scene_index,
+        )
+        if not highlight_json:
+            raise RuntimeError("Highlight generation failed")
+        cache.put_json(highlights_cache_key(digest, transcription), highlight_json)
+        if not clips:
+            raise RuntimeError("Failed to process the video")
+        render_key = cache_key("render", digest, highlight_json, render_settings)
+        return highlight_json, cache.put_files(render_key, clips, move=True)
+
+    stages = [
+        Stage("probe", probe_video, ("video_path",), ("video_info",)),
+        Stage("scenes", scenes, ("video_path", "video_info", "digest"), ("scene_index",)),
+        Stage("extract_audio", audio, ("video_path", "digest"), ("audio_path",)),
+        Stage("transcribe", transcribe, ("audio_path", "digest"), ("transcription",)),
+        Stage("transcript_store", TranscriptStore.from_text, ("transcription",), ("transcript_store",)),
+    ]
+    if stream:
+        stages.append(Stage("highlights+render", stream_render,
+                            ("video_path", "video_info", "transcription", "transcript_store", "scene_index", "digest"),
+                            ("highlights", "clips")))
+    else:
+        stages += [
+            Stage("highlights", highlights, ("video_info", "transcription", "digest"), ("highlights",)),
+            Stage("render", render, ("video_path", "video_info", "highlights", "transcript_store", "scene_index", "digest"),
+                  ("clips",)),
+        ]
+    return stages
+
+
+def run_pipeline(video_path, digest, options=None, progress=None, limits=None, workspace_name=None):
+    """Run the whole pipeline for one video; returns (values, TimingReport).
+
+    Cached transcripts and highlights are seeded into the graph so their
+    stages are skipped. `limits` caps per-stage concurrency across runs (see
+    stage_scheduler.run_stages). Intermediates go to the scratch workspace
+    `workspace_name` (see workspace), which is deleted if the run fails.
+    Raises stage_scheduler.StageError when a stage fails.
+    """
+    options = options or PipelineOptions()
+    cache = get_cache()
+    values = {"video_path": str(video_path), "digest": digest}
+
+    transcription = cache.get_json(transcript_cache_key(digest, options))
+    if transcription is not None:
+        print("Transcript cache hit ✅")
+        values["transcription"] = transcription
+        # Nothing else needs the audio once the transcript exists
+        values["audio_path"] = None
+        highlight_json = cache.get_json(highlights_cache_key(digest, transcription))
+        if highlight_json is not None:
+            print("Highlights cache hit ✅")
+            values["highlights"] = highlight_json
+
+    # Streaming only pays off when highlights still have to be generated and
+    # clips are rendered one by one
+    stream = options.stream and (options.parallel or not options.burn_captions) and "highlights" not in values
+    name = workspace_name or f"run-{digest[:12]}-{uuid.uuid4().hex[:6]}"
+    # Pins the upload's own workspace too, if the video lives in scratch
+    with get_workspace_manager().workspace(name, hold=[video_path]) as workspace, workspace_scope(workspace):
+        return run_stages(build_stages(options, stream=stream), values, progress=progress, limits=limits)
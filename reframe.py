@@ -0,0 +1,125 @@
+"""Subject-tracked 9:16 crop paths.
+
+Instead of always cropping the middle of the frame, find where the speaker
+is and follow them. The clip is sampled a few times a second at low
+resolution (ANALYSIS_FPS, ANALYSIS_WIDTH) and each sample scores every
+column of the frame: faces found by OpenCV's Haar cascade when it is
+available, otherwise motion between samples, which in a talk is mostly the
+person talking. The crop window covering the most score is picked per
+sample, gaps are filled in, the path is smoothed with a Gaussian filter and
+interpolated to one left-edge offset per output frame, so the render loop
+does nothing more than slice each frame at its offset.
+"""
+import os
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from ffmpeg_utils import read_gray_frames
+
+ANALYSIS_FPS = float(os.getenv("SHORTIFY_REFRAME_FPS", "3"))
+ANALYSIS_WIDTH = 256
+# Standard deviation of the smoothing filter, in seconds of clip time
+SMOOTHING_SECONDS = 0.8
+# Motion below this mean absolute difference (0-255) is treated as noise
+MOTION_THRESHOLD = 2.0
+FACE_CASCADE = os.getenv("SHORTIFY_FACE_CASCADE", "haarcascade_frontalface_default.xml")
+
+
+@lru_cache(maxsize=None)
+def _face_detector():
+    """The Haar face cascade, or None if this OpenCV build doesn't ship one."""
+    path = FACE_CASCADE
+    if not os.path.isabs(path):
+        data_dir = getattr(getattr(cv2, "data", None), "haarcascades", "")
+        path = os.path.join(data_dir, path)
+    if not os.path.exists(path):
+        return None
+    detector = cv2.CascadeClassifier(path)
+    return None if detector.empty() else detector
+
+
+def _face_scores(frame):
+    """Per-column score from the faces in one grey sample, or None if there are none."""
+    detector = _face_detector()
+    if detector is None:
+        return None
+    faces = detector.detectMultiScale(frame, scaleFactor=1.1, minNeighbors=4, minSize=(16, 16))
+    if len(faces) == 0:
+        return None
+    scores = np.zeros(frame.shape[1], dtype=np.float32)
+    for x, y, w, h in faces:
+        # Bigger (closer) faces win over people in the background
+        scores[x:x + w] += w * h
+    return scores
+
+
+def subject_centers(frames, crop_width):
+    """Best crop-window center per sample in analysis pixels, NaN where nothing stands out."""
+    count, _, width = frames.shape
+    centers = np.full(count, np.nan)
+    if count == 0 or crop_width >= width:
+        return centers
+
+    # Motion profile for every sample at once: column means of |frame - previous frame|
+    diffs = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=1)
+    motion = np.vstack([diffs[:1], diffs]) if len(diffs) else np.zeros((count, width))
+    motion[motion < MOTION_THRESHOLD] = 0
+
+    window = np.ones(crop_width, dtype=np.float32)
+    for i in range(count):
+        scores = _face_scores(frames[i])
+        if scores is None:
+            scores = motion[i]
+        if not scores.any():
+            continue
+        # Score of every crop position; the best one keeps the most of the subject in frame
+        coverage = np.convolve(scores, window, mode="valid")
+        centers[i] = np.argmax(coverage) + crop_width / 2
+    return centers
+
+
+def smooth_path(centers, sample_fps=ANALYSIS_FPS, sigma_seconds=SMOOTHING_SECONDS):
+    """Fill gaps by interpolation and Gaussian-smooth a path of centers; None if every sample is empty."""
+    centers = np.asarray(centers, dtype=np.float64)
+    known = ~np.isnan(centers)
+    if not known.any():
+        return None
+    index = np.arange(len(centers))
+    filled = np.interp(index, index[known], centers[known])
+
+    sigma = max(sigma_seconds * sample_fps, 1e-6)
+    radius = int(3 * sigma)
+    if radius < 1:
+        return filled
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    padded = np.pad(filled, radius, mode="edge")
+    return np.convolve(padded, kernel, mode="valid")
+
+
+def crop_offsets(video_file, start, fps, total_frames, size, crop_width):
+    """Left crop edge, in source pixels, for each of `total_frames` frames from `start` seconds.
+
+    Returns None when the subject can't be located, so callers keep their centered crop.
+    """
+    width, height = size
+    if total_frames <= 0 or crop_width >= width:
+        return None
+    scale = ANALYSIS_WIDTH / width
+    analysis_size = (ANALYSIS_WIDTH, max(2, int(round(height * scale / 2)) * 2))
+    duration = total_frames / fps
+    frames = read_gray_frames(video_file, start, duration, ANALYSIS_FPS, analysis_size)
+    if len(frames) == 0:
+        return None
+
+    path = smooth_path(subject_centers(frames, max(1, int(round(crop_width * scale)))))
+    if path is None:
+        return None
+    # Sample i shows clip time i / ANALYSIS_FPS, map it to every output frame
+    sample_times = np.arange(len(path)) / ANALYSIS_FPS
+    frame_times = np.arange(total_frames) / fps
+    centers = np.interp(frame_times, sample_times, path) / scale
+    return np.clip(np.rint(centers - crop_width / 2), 0, width - crop_width).astype(np.int32)
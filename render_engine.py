@@ -0,0 +1,298 @@
+"""Single-decode render engine for cutting several shorts out of one video.
+
+The source is opened once and decoded in time order. Every decoded frame is
+handed to each highlight window that covers it, and each window owns its own
+ffmpeg encoder, so N highlights cost one decode pass instead of N and every
+short is encoded exactly once with its audio muxed in.
+"""
+import contextvars
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from fractions import Fraction
+from multiprocessing import get_context
+
+import cv2
+
+from cancellation import check_cancelled, current_token
+from captions import CaptionRenderer, build_caption_index, spread_words
+from ffmpeg_utils import FFmpegClipWriter
+from reframe import crop_offsets
+from workspace import scratch_dir
+
+# Gaps between highlight windows shorter than this are skipped with grab(),
+# longer ones are cheaper to jump over with a single seek.
+SEEK_GAP_FRAMES = 300
+
+# Bump whenever rendered output changes, so cached shorts aren't reused
+RENDER_VERSION = 4
+
+# Upper bound on render worker processes, whatever the machine reports
+MAX_RENDER_WORKERS = 16
+
+
+@dataclass
+class ClipSpec:
+    """One highlight to render: a [start, end) window in seconds plus its captions.
+
+    `captions` are timed (start, end, text) cues in source seconds. Plain
+    `words` without timings are spread evenly over the clip instead.
+    """
+    start: float
+    end: float
+    words: list = field(default_factory=list)
+    captions: list = field(default_factory=list)
+
+
+@dataclass
+class ClipResult:
+    """Outcome of rendering one highlight: either an output path or an error message."""
+    index: int
+    path: str = None
+    error: str = None
+
+
+def crop_bounds(width, height, aspect_ratio=9 / 16):
+    """Return the x1, x2 columns of a centered crop with the given aspect ratio."""
+    new_width = int(height * aspect_ratio)
+    x_center = width // 2
+    return x_center - new_width // 2, x_center + new_width // 2
+
+
+def _rate(fps):
+    """ffmpeg-friendly frame rate, e.g. 29.97 -> "30000/1001"."""
+    rate = Fraction(fps).limit_denominator(1001)
+    return f"{rate.numerator}/{rate.denominator}"
+
+
+class _ClipWindow:
+    """Per-highlight state: frame range, caption progress and the output writer."""
+
+    def __init__(self, video_file, spec, fps, x1, x2, height, out_dir=None, width=None, analysis=None, frame_count=0):
+        self.start_frame = int(round(spec.start * fps))
+        # OpenCV clamps seeks past the end instead of failing, so check up front
+        if frame_count and self.start_frame >= frame_count:
+            raise RuntimeError(f"Clip starts at frame {self.start_frame}, past the end of the video ({frame_count} frames)")
+        self.total_frames = max(0, int(round((spec.end - spec.start) * fps)))
+        self.frames_written = 0
+        self.error = None
+        self.x1, self.x2 = x1, x2
+
+        # Work out which caption every frame shows before any frame is decoded
+        clip_start = self.start_frame / fps
+        # Likewise where the crop sits on every frame when following the speaker. That
+        # needs its own decode, so it runs on the `analysis` pool while earlier clips render
+        self.offsets = None
+        self._analysis = None
+        if analysis is not None and width:
+            self._analysis = analysis.submit(
+                contextvars.copy_context().run, crop_offsets,
+                video_file, clip_start, fps, self.total_frames, (width, height), x2 - x1,
+            )
+        cues = spec.captions or spread_words(spec.words, spec.start, spec.end)
+        self.caption_index, self.caption_texts = build_caption_index(cues, clip_start, fps, self.total_frames)
+        self.captioner = CaptionRenderer(x2 - x1, height)
+
+        self.path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4", dir=out_dir).name
+        self.out = FFmpegClipWriter(
+            self.path, _rate(fps), (x2 - x1, height),
+            audio_source=video_file, start=clip_start, duration=self.total_frames / fps,
+        )
+
+    @property
+    def done(self):
+        return self.frames_written >= self.total_frames
+
+    def _wait_for_analysis(self):
+        try:
+            self.offsets = self._analysis.result()
+        except Exception as e:
+            print(f"Subject tracking failed, using a centered crop: {e}")
+        self._analysis = None
+
+    def write(self, frame, shared):
+        if self._analysis is not None:
+            self._wait_for_analysis()
+        # Crop the frame to the desired aspect ratio. When other windows are
+        # looking at the same decoded frame, copy so captions don't bleed.
+        if self.offsets is not None:
+            x1 = self.offsets[self.frames_written]
+            frame = frame[:, x1:x1 + self.x2 - self.x1]
+        else:
+            frame = frame[:, self.x1:self.x2]
+        if shared:
+            frame = frame.copy()
+
+        caption_id = self.caption_index[self.frames_written]
+        if caption_id >= 0:
+            self.captioner.draw(frame, self.caption_texts[caption_id])
+
+        self.out.write(frame)
+        self.frames_written += 1
+
+    def release(self):
+        self.out.release()
+
+    def abort(self):
+        self.out.abort()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def render_clips(video_file, specs, out_dir=None, reframe=False):
+    """Render every ClipSpec from a single decode of `video_file`.
+
+    Returns one ClipResult per spec, in the same order as `specs`, with the
+    finished clip (video and audio) written to `out_dir` or else the current
+    job's workspace. A failing clip records its error instead of aborting the
+    rest. With `reframe` the 9:16 crop follows the speaker (see reframe)
+    instead of staying centered.
+    """
+    out_dir = out_dir or scratch_dir()
+    cap = cv2.VideoCapture(video_file)
+    results = [ClipResult(i) for i in range(len(specs))]
+    windows = {}
+    # Speaker tracking decodes each clip once more in ffmpeg, which can run alongside this decode
+    analysis = ThreadPoolExecutor(max_workers=max(1, min(len(specs), os.cpu_count() or 1)),
+                                  thread_name_prefix="reframe") if reframe else None
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        x1, x2 = crop_bounds(width, height)
+
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        for i, spec in enumerate(specs):
+            check_cancelled()
+            try:
+                windows[i] = _ClipWindow(video_file, spec, fps, x1, x2, height, out_dir, width, analysis, frame_count)
+            except Exception as e:
+                results[i].error = str(e)
+        pending = sorted((w for w in windows.values() if not w.done), key=lambda w: w.start_frame)
+        active = []
+
+        pos = pending[0].start_frame if pending else 0
+        cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+
+        while pending or active:
+            while pending and pending[0].start_frame <= pos:
+                active.append(pending.pop(0))
+
+            if not active:
+                # Nothing covers this stretch of the source, move to the next window
+                next_start = pending[0].start_frame
+                if next_start - pos > SEEK_GAP_FRAMES:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, next_start)
+                    pos = next_start
+                else:
+                    while pos < next_start and cap.grab():
+                        pos += 1
+                    if pos < next_start:
+                        break
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            shared = len(active) > 1
+            for window in active:
+                try:
+                    window.write(frame, shared)
+                except Exception as e:
+                    # This clip's encoder died, the others carry on
+                    window.error = str(e)
+                    window.abort()
+            pos += 1
+            active = [w for w in active if not w.done and w.error is None]
+
+        for i, window in list(windows.items()):
+            del windows[i]
+            if window.error is not None:
+                results[i].error = window.error
+                continue
+            try:
+                if window.total_frames and not window.frames_written:
+                    raise RuntimeError(f"No frames decoded for clip starting at frame {window.start_frame}")
+                window.release()
+                results[i].path = window.path
+            except Exception as e:
+                results[i].error = str(e)
+                window.abort()
+        # Cancelling kills the encoders, which shows up above as per-clip errors
+        check_cancelled()
+        return results
+    except BaseException:
+        for window in windows.values():
+            window.abort()
+        raise
+    finally:
+        cap.release()
+        if analysis is not None:
+            analysis.shutdown(wait=True, cancel_futures=True)
+
+
+def _render_one(video_file, spec, out_dir, reframe):
+    # Each worker already owns a core, keep OpenCV from spawning its own thread pool
+    cv2.setNumThreads(1)
+    result = render_clips(video_file, [spec], out_dir, reframe)[0]
+    if result.error:
+        raise RuntimeError(result.error)
+    return result.path
+
+
+def render_clips_parallel(video_file, specs, max_workers=None, reframe=False):
+    """Render each ClipSpec in its own worker process.
+
+    Returns one ClipResult per spec, in the same order as `specs`. A failing
+    clip records its error instead of aborting the rest of the batch.
+
+    `specs` can be a generator: each clip is submitted as soon as it is
+    yielded, so rendering overlaps whatever produces the later ones.
+    """
+    results = []
+    workers = min(max_workers or os.cpu_count() or 1, MAX_RENDER_WORKERS)
+    if hasattr(specs, "__len__"):
+        if not specs:
+            return results
+        workers = min(workers, len(specs))
+
+    token = current_token()
+    # Worker processes don't inherit the job's context, hand them its workspace
+    out_dir = scratch_dir()
+    # spawn rather than fork: the Streamlit server process is multi-threaded
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        # Cancelling the job kills the workers; their encoders exit when stdin closes
+        kill = lambda: _kill_workers(pool)
+        if token is not None:
+            token.add_callback(kill)
+        try:
+            futures = {}
+            for i, spec in enumerate(specs):
+                check_cancelled()
+                results.append(ClipResult(i))
+                futures[pool.submit(_render_one, video_file, spec, out_dir, reframe)] = i
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i].path = future.result()
+                except Exception as e:
+                    results[i].error = str(e)
+        finally:
+            if token is not None:
+                token.remove_callback(kill)
+    check_cancelled()
+    return results
+
+
+def _kill_workers(pool):
+    kill_workers = getattr(pool, "kill_workers", None)  # Python 3.14+
+    if kill_workers is not None:
+        kill_workers()
+        return
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.kill()
@@ -0,0 +1,124 @@
+"""Shot boundaries of a video, for snapping highlight edges to cuts.
+
+The model's timestamps are only as good as the transcript, so a clip often
+starts a few frames before a cut or halfway into a shot. The whole video is
+decoded once at thumbnail size (ANALYSIS_SIZE) and every frame's grey-level
+histogram is compared with the previous one's, a batch of frames at a time
+with NumPy. Frames where the histogram changes sharply, and more than
+anywhere else nearby, are cuts. The index is cached per video, so it is built
+once and reused by every clip and every rerun.
+"""
+import os
+
+import numpy as np
+
+from ffmpeg_utils import iter_gray_frames
+
+# Bump whenever detection changes, so cached indexes are rebuilt
+SCENE_INDEX_VERSION = 1
+ANALYSIS_SIZE = (64, 36)
+HISTOGRAM_BINS = 32
+# Histogram distance (0 = identical, 1 = disjoint) above which a frame may be a cut
+CUT_THRESHOLD = float(os.getenv("SHORTIFY_CUT_THRESHOLD", "0.35"))
+# Cuts closer together than this are one cut, the strongest wins (also absorbs fades and flashes)
+MIN_SHOT_SECONDS = 0.5
+# How far a highlight edge may move to land on a cut
+SNAP_TOLERANCE_SECONDS = float(os.getenv("SHORTIFY_SNAP_TOLERANCE", "1.5"))
+# Never snap a clip shorter than this
+MIN_CLIP_SECONDS = 3.0
+
+
+def _histograms(frames):
+    """Normalised grey-level histograms of a (n, h, w) batch, as an (n, HISTOGRAM_BINS) array."""
+    count = len(frames)
+    pixels = frames.shape[1] * frames.shape[2]
+    bins = (frames >> (8 - int(np.log2(HISTOGRAM_BINS)))).reshape(count, -1).astype(np.int64)
+    # One bincount for the whole batch: frame i's bins are offset by i * HISTOGRAM_BINS
+    bins += (np.arange(count) * HISTOGRAM_BINS)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=count * HISTOGRAM_BINS)
+    return counts.reshape(count, HISTOGRAM_BINS) / pixels
+
+
+def cut_scores(video_file):
+    """Per-frame cut scores from one downscaled pass over `video_file`.
+
+    Score i is the histogram distance between frame i and frame i - 1.
+    """
+    scores = []
+    previous = None
+    for frames in iter_gray_frames(video_file, ANALYSIS_SIZE):
+        hists = _histograms(frames)
+        if previous is None:
+            previous = hists[:1]
+        stacked = np.vstack([previous, hists])
+        # Half the L1 distance, so the score lies in [0, 1]
+        scores.append(0.5 * np.abs(np.diff(stacked, axis=0)).sum(axis=1))
+        previous = hists[-1:]
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def find_cuts(scores, fps, threshold=CUT_THRESHOLD, min_shot_seconds=MIN_SHOT_SECONDS):
+    """Frame numbers where a new shot starts: scores over `threshold` that are the maximum of their neighbourhood."""
+    if len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    radius = max(1, int(round(min_shot_seconds * fps)))
+    padded = np.pad(scores, radius, mode="constant")
+    # Running maximum over +-radius frames, computed for every frame at once
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1)
+    is_peak = (scores >= windows.max(axis=1)) & (scores > threshold)
+    cuts = np.flatnonzero(is_peak)
+    # Equal scores on consecutive frames would both count as the peak, keep the first
+    if len(cuts) > 1:
+        cuts = cuts[np.concatenate([[True], np.diff(cuts) > radius])]
+    return cuts[cuts > 0]
+
+
+class SceneIndex:
+    """Cut times in seconds, searchable by time."""
+
+    def __init__(self, cuts, duration=None):
+        self.cuts = np.asarray(sorted(cuts), dtype=np.float64)
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.cuts)
+
+    def nearest(self, seconds, tolerance=SNAP_TOLERANCE_SECONDS):
+        """The cut closest to `seconds`, or None if none is within `tolerance`."""
+        if not len(self.cuts):
+            return None
+        i = np.searchsorted(self.cuts, seconds)
+        candidates = self.cuts[max(0, i - 1):i + 1]
+        best = candidates[np.argmin(np.abs(candidates - seconds))]
+        return float(best) if abs(best - seconds) <= tolerance else None
+
+    def snap(self, start, end, tolerance=SNAP_TOLERANCE_SECONDS):
+        """Move `start` and `end` onto the nearest cuts within `tolerance`.
+
+        A clip that starts on a cut opens on the new shot's first frame and
+        one that ends on a cut stops on the last frame before it. An edge
+        stays put when there's no cut nearby or snapping would leave the clip
+        shorter than MIN_CLIP_SECONDS.
+        """
+        new_start = self.nearest(start, tolerance)
+        new_end = self.nearest(end, tolerance)
+        if new_start is not None and end - new_start >= MIN_CLIP_SECONDS:
+            start = new_start
+        if new_end is not None and new_end - start >= MIN_CLIP_SECONDS:
+            end = new_end
+        return start, end
+
+    def to_dict(self):
+        return {"cuts": [round(float(t), 3) for t in self.cuts], "duration": self.duration}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["cuts"], data.get("duration"))
+
+
+def build_scene_index(video_file, fps, duration=None):
+    """Detect the cuts of `video_file` (decoded at its native `fps`) in one pass."""
+    scores = cut_scores(video_file)
+    cuts = find_cuts(scores, fps)
+    print(f"Found {len(cuts)} scene cuts ✅")
+    return SceneIndex(cuts / fps, duration)
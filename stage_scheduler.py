@@ -0,0 +1,192 @@
+"""Run pipeline stages as a dependency graph instead of a fixed sequence.
+
+Each stage names the values it needs and the values it produces. The
+scheduler starts every stage whose inputs exist, on a thread pool, so
+independent work (probing the video while its audio is being transcribed, say)
+overlaps. It records when each stage ran and derives the critical path: the
+chain of stages that actually determined how long the job took.
+"""
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Stage:
+    """One step of a job.
+
+    `fn` is called with the stage's inputs as keyword arguments. It returns
+    the single output directly, or a tuple when the stage has several.
+    """
+    name: str
+    fn: object
+    inputs: tuple = ()
+    outputs: tuple = ()
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    end: float = None
+    after: list = field(default_factory=list)
+    error: str = None
+
+    @property
+    def duration(self):
+        return (self.end or self.start) - self.start
+
+
+class TimingReport:
+    """When every stage ran, relative to the start of the job."""
+
+    def __init__(self, timings, total):
+        self.timings = timings
+        self.total = total
+
+    def critical_path(self):
+        """Stage names, first to last, on the chain that finished last.
+
+        Walks back from the last stage to finish, each time to whichever of
+        its producers finished last.
+        """
+        done = {name: t for name, t in self.timings.items() if t.end is not None}
+        if not done:
+            return []
+        path = [max(done.values(), key=lambda t: t.end)]
+        while True:
+            producers = [done[name] for name in path[-1].after if name in done]
+            if not producers:
+                break
+            path.append(max(producers, key=lambda t: t.end))
+        return [t.name for t in reversed(path)]
+
+    def as_dict(self):
+        return {
+            "total": round(self.total, 3),
+            "critical_path": self.critical_path(),
+            "stages": {
+                name: {"start": round(t.start, 3), "seconds": round(t.duration, 3), "after": t.after, "error": t.error}
+                for name, t in self.timings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        timings = {
+            name: StageTiming(name, stage["start"], stage["start"] + stage["seconds"], stage.get("after", []), stage.get("error"))
+            for name, stage in data["stages"].items()
+        }
+        return cls(timings, data["total"])
+
+    def format(self):
+        critical = set(self.critical_path())
+        lines = [f"{'stage':<20}{'start':>9}{'seconds':>9}"]
+        for t in sorted(self.timings.values(), key=lambda t: t.start):
+            mark = " *" if t.name in critical else ""
+            status = f"  failed: {t.error}" if t.error else ""
+            lines.append(f"{t.name:<20}{t.start:>9.2f}{t.duration:>9.2f}{mark}{status}")
+        lines.append(f"total {self.total:.2f}s, critical path (*): {' -> '.join(self.critical_path())}")
+        return "\n".join(lines)
+
+
+class StageError(RuntimeError):
+    """A stage raised; carries the partial values and the timing report."""
+
+    def __init__(self, stage, error, values, report):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.values = values
+        self.report = report
+
+
+def run_stages(stages, values=None, max_workers=None, progress=None, limits=None):
+    """Run `stages` as soon as their inputs are available.
+
+    `values` seeds the graph (e.g. the video path); stages whose outputs are
+    already in it are skipped, which is how cached results short-circuit work.
+    `progress(stage_name, state)` is called with "pending" for every stage
+    that will run, then "started", "done" or "failed". `limits` maps stage
+    names to semaphores shared between concurrent runs, capping how many of
+    that stage run at once; a stage's timing starts once it holds its
+    semaphore. Returns (values, TimingReport). If a stage raises, stages
+    already running finish, nothing new starts, and StageError is raised.
+    """
+    values = dict(values or {})
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"'{output}' is produced by both '{producers[output]}' and '{stage.name}'")
+            producers[output] = stage.name
+    pending = [s for s in stages if not all(o in values for o in s.outputs) or not s.outputs]
+    for stage in pending:
+        missing = [i for i in stage.inputs if i not in values and i not in producers]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' needs {missing}, which nothing produces")
+
+    if progress:
+        for stage in pending:
+            progress(stage.name, "pending")
+
+    lock = threading.Lock()
+    timings = {}
+    failure = None
+    t0 = time.perf_counter()
+
+    def run(stage):
+        limit = (limits or {}).get(stage.name)
+        with limit if limit is not None else nullcontext():
+            with lock:
+                timings[stage.name] = StageTiming(
+                    stage.name, time.perf_counter() - t0,
+                    after=sorted({producers[i] for i in stage.inputs if i in producers}),
+                )
+                kwargs = {name: values[name] for name in stage.inputs}
+            if progress:
+                progress(stage.name, "started")
+            result = stage.fn(**kwargs)
+        if len(stage.outputs) == 1:
+            result = (result,)
+        with lock:
+            timings[stage.name].end = time.perf_counter() - t0
+            for name, value in zip(stage.outputs, result or ()):
+                values[name] = value
+        if progress:
+            progress(stage.name, "done")
+
+    workers = max_workers or max(1, len(pending))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as pool:
+        running = {}
+        while pending or running:
+            if failure is None:
+                for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(stage)
+                    # Carry the caller's context (e.g. a job's cancel token) into the worker
+                    running[pool.submit(contextvars.copy_context().run, run, stage)] = stage
+            if not running:
+                if pending and failure is None:
+                    raise ValueError(f"Stages {[s.name for s in pending]} can never run")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    with lock:
+                        timing = timings[stage.name]
+                        timing.end = time.perf_counter() - t0
+                        timing.error = str(error)
+                    if progress:
+                        progress(stage.name, "failed")
+                    if failure is None:
+                        failure = (stage.name, error)
+
+    report = TimingReport(timings, time.perf_counter() - t0)
+    if failure is not None:
+        raise StageError(failure[0], failure[1], values, report) from failure[1]
+    return values, report
@@ -0,0 +1,100 @@
+"""Fast timestamp parsing straight to float seconds.
+
+One compiled regex replaces the old loop over 19 `strptime` formats (which
+raised and caught an exception for every miss). It accepts everything that
+loop did plus plain numeric seconds, keeps sub-second precision, and is
+memoised because LLM output repeats the same strings a lot.
+
+Accepted forms:
+    "12", "12.5", 12.5            plain seconds
+    "MM:SS", "MM:SS.fff"          minutes and seconds ("," works as the decimal point too)
+    "HH:MM:SS", "HH:MM:SS.fff"
+    "10:30 PM", "10:30:15.123 PM" 12-hour clock times, as seconds since midnight
+    "2024-12-30T15:30:00.123Z"    ISO 8601; the date part is ignored
+
+Run `python timeparse.py` for a micro-benchmark against the strptime loop.
+"""
+import re
+from functools import lru_cache
+
+_NUMBER = re.compile(r"^[+-]?(?:\d+(?:\.\d*)?|\.\d+)$")
+_CLOCK = re.compile(
+    r"^(?:\d{4}-\d{2}-\d{2}[T ])?"
+    r"(\d+)(?::(\d+))?(?::(\d+))?"
+    r"(?:[.,](\d+))?"
+    r"\s*(?:([AaPp])\.?[Mm]\.?)?Z?$"
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_string(text):
+    text = text.strip()
+    if _NUMBER.match(text):
+        return float(text)
+    match = _CLOCK.match(text)
+    if match is None:
+        raise ValueError(f"Time string '{text}' does not match any known format.")
+
+    first, second, third, fraction, meridiem = match.groups()
+    fraction = float("0." + fraction) if fraction else 0.0
+    if third is not None:
+        hours, minutes, seconds = int(first), int(second), int(third)
+    elif second is not None and meridiem:
+        # "10:30 PM" is hours:minutes
+        hours, minutes, seconds = int(first), int(second), 0
+    elif second is not None:
+        hours, minutes, seconds = 0, int(first), int(second)
+    else:
+        hours, minutes, seconds = 0, 0, int(first)
+
+    if meridiem:
+        hours = hours % 12 + (12 if meridiem in "Pp" else 0)
+    return hours * 3600 + minutes * 60 + seconds + fraction
+
+
+def parse_seconds(value):
+    """Convert a timestamp (see module docstring) or a number to float seconds.
+
+    Raises ValueError when the string isn't a recognised timestamp.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _parse_string(str(value))
+
+
+def format_timestamp(seconds):
+    """Format float seconds as HH:MM:SS.mmm."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600 * 1000)
+    minutes, millis = divmod(millis, 60 * 1000)
+    return f"{hours:02d}:{minutes:02d}:{millis / 1000:06.3f}"
+
+
+if __name__ == "__main__":
+    import timeit
+    from datetime import datetime
+
+    legacy_formats = [
+        "%H:%M:%S.%f", "%H:%M:%S", "%M:%S", "%S.%f", "%H:%M", "%M:%S.%f", "%H:%M:%S,%f",
+        "%H:%M,%f", "%M:%S,%f", "%H:%M:%S.%f %p", "%I:%M:%S.%f %p", "%I:%M:%S %p", "%I:%M %p",
+        "%H:%M:%S", "%H:%M:%S.%f", "%S", "%S.%f", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%d %H:%M:%S",
+    ]
+    epoch = datetime.strptime("00:00:00.000", "%H:%M:%S.%f")
+
+    def legacy_seconds(time_str):
+        for fmt in legacy_formats:
+            try:
+                return (datetime.strptime(time_str, fmt) - epoch).total_seconds()
+            except ValueError:
+                continue
+        raise ValueError(time_str)
+
+    samples = ["00:01:23.450", "01:23", "00:00:07", "12.5", "10:30:15 PM", "00:12:00,250"]
+    number = 20000
+    legacy = timeit.timeit(lambda: [legacy_seconds(s) for s in samples], number=number)
+    uncached = timeit.timeit(lambda: [_parse_string.__wrapped__(s) for s in samples], number=number)
+    cached = timeit.timeit(lambda: [parse_seconds(s) for s in samples], number=number)
+    calls = number * len(samples)
+    print(f"strptime loop : {legacy / calls * 1e6:7.2f} us/call")
+    print(f"regex         : {uncached / calls * 1e6:7.2f} us/call ({legacy / uncached:.0f}x)")
+    print(f"regex+memo    : {cached / calls * 1e6:7.2f} us/call ({legacy / cached:.0f}x)")
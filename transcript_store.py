@@ -0,0 +1,113 @@
+"""Compact, array-backed transcript segments with time-range lookup.
+
+Segment start/end times live in NumPy arrays and all text lives in one UTF-8
+buffer addressed by offsets, so a transcript of an hour-long talk is a few
+small arrays instead of thousands of dicts. Overlap queries are two binary
+searches. A store saves to a directory of .npy files that `load` can
+memory-map.
+"""
+import json
+import os
+
+import numpy as np
+
+from chunked_transcription import parse_segments
+from timeparse import parse_seconds
+
+
+class TranscriptStore:
+    def __init__(self, starts, ends, offsets, text_buffer):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.text_buffer = text_buffer
+        # Running max of end times lets overlap queries binary-search on ends
+        # too, even when segments overlap a little
+        self._max_end = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build a store from {"text", "start", "end"} dicts, in any order."""
+        rows = []
+        for segment in segments:
+            try:
+                start = parse_seconds(segment["start"])
+                end = parse_seconds(segment["end"])
+            except (KeyError, ValueError, TypeError):
+                continue
+            rows.append((start, max(start, end), str(segment.get("text", "")).strip()))
+        rows.sort(key=lambda row: row[0])
+
+        encoded = [text.encode("utf-8") for _, _, text in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        if encoded:
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+        text_buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls([r[0] for r in rows], [r[1] for r in rows], offsets, text_buffer)
+
+    @classmethod
+    def from_text(cls, transcription):
+        """Build a store from a model's JSON transcript text; empty if it isn't JSON."""
+        try:
+            return cls.from_segments(parse_segments(transcription))
+        except (ValueError, TypeError, AttributeError):
+            return cls.from_segments([])
+
+    def text(self, i):
+        return bytes(self.text_buffer[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def overlapping(self, t0, t1):
+        """Indices of segments overlapping [t0, t1), in time order."""
+        lo = int(np.searchsorted(self._max_end, t0, side="right"))
+        hi = int(np.searchsorted(self.starts, t1, side="left"))
+        if hi <= lo:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.arange(lo, hi)
+        return idx[self.ends[lo:hi] > t0]
+
+    def slice_text(self, t0, t1):
+        """All text spoken in [t0, t1), joined with spaces."""
+        return " ".join(self.text(i) for i in self.overlapping(t0, t1))
+
+    def words(self, t0=None, t1=None):
+        """Word-level (start, end, word) triples, timed by spreading each segment over its words.
+
+        Restricted to words overlapping [t0, t1) when given.
+        """
+        indices = range(len(self)) if t0 is None else self.overlapping(t0, t1)
+        out = []
+        for i in indices:
+            words = self.text(i).split()
+            if not words:
+                continue
+            start, end = self.starts[i], self.ends[i]
+            # Weight each word by its length so long words stay on screen longer
+            weights = np.cumsum([0] + [len(w) + 1 for w in words], dtype=np.float64)
+            bounds = start + (end - start) * weights / weights[-1]
+            for word, w0, w1 in zip(words, bounds[:-1], bounds[1:]):
+                if t0 is None or (w1 > t0 and w0 < t1):
+                    out.append((float(w0), float(w1), word))
+        return out
+
+    def to_segments(self):
+        return [{"text": self.text(i), "start": float(self.starts[i]), "end": float(self.ends[i])} for i in range(len(self))]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "starts.npy"), self.starts)
+        np.save(os.path.join(directory, "ends.npy"), self.ends)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "text.npy"), np.asarray(self.text_buffer, dtype=np.uint8))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"segments": len(self)}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved store; arrays are memory-mapped read-only unless mmap=False."""
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mode)
+                  for name in ("starts.npy", "ends.npy", "offsets.npy", "text.npy")]
+        return cls(*arrays)
@@ -0,0 +1,138 @@
+"""Process-wide pool of loaded faster-whisper models.
+
+Loading Whisper weights takes seconds and hundreds of MB, so models are kept
+resident across Streamlit reruns and sessions and shared between concurrent
+users. Models are keyed by (size, device, compute type, CPU threads). At most
+`max_resident` stay loaded; the least recently used idle model is unloaded
+when a new one is needed.
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_MODEL_SIZE = "base.en"
+MAX_RESIDENT_MODELS = int(os.getenv("SHORTIFY_WHISPER_MAX_MODELS", "2"))
+# Concurrent transcribe() calls one loaded model can serve
+WORKERS_PER_MODEL = int(os.getenv("SHORTIFY_WHISPER_WORKERS", "2"))
+
+
+def default_device():
+    """"cuda" when CTranslate2 sees a GPU, else "cpu"."""
+    try:
+        import ctranslate2
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    except Exception:
+        return "cpu"
+
+
+def default_compute_type(device):
+    return "float16" if device == "cuda" else "int8"
+
+
+class _PooledModel:
+    def __init__(self):
+        self.model = None
+        self.users = 0
+        self.loaded = threading.Event()
+        self.error = None
+
+
+class WhisperModelPool:
+    def __init__(self, max_resident=MAX_RESIDENT_MODELS, workers_per_model=WORKERS_PER_MODEL):
+        self.max_resident = max_resident
+        self.workers_per_model = workers_per_model
+        self._lock = threading.Lock()
+        self._models = OrderedDict()
+
+    def key(self, size=DEFAULT_MODEL_SIZE, device=None, compute_type=None, cpu_threads=0):
+        device = device or default_device()
+        return (size, device, compute_type or default_compute_type(device), cpu_threads)
+
+    @contextmanager
+    def model(self, size=DEFAULT_MODEL_SIZE, device=None, compute_type=None, cpu_threads=0):
+        """Borrow a loaded WhisperModel; it can't be unloaded while borrowed."""
+        key = self.key(size, device, compute_type, cpu_threads)
+        with self._lock:
+            entry = self._models.get(key)
+            load = entry is None
+            if load:
+                self._evict(room_for=1)
+                entry = self._models[key] = _PooledModel()
+            self._models.move_to_end(key)
+            entry.users += 1
+
+        try:
+            if load:
+                # Load outside the pool lock, other keys stay usable meanwhile
+                try:
+                    entry.model = self._load(*key)
+                except Exception as e:
+                    entry.error = e
+                    with self._lock:
+                        self._models.pop(key, None)
+                    raise
+                finally:
+                    entry.loaded.set()
+            else:
+                entry.loaded.wait()
+                if entry.error is not None:
+                    raise entry.error
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+
+    def _load(self, size, device, compute_type, cpu_threads):
+        from faster_whisper import WhisperModel
+        print(f"Loading Whisper {size} on {device} ({compute_type})...")
+        return WhisperModel(size, device=device, compute_type=compute_type,
+                            cpu_threads=cpu_threads, num_workers=self.workers_per_model)
+
+    def _evict(self, room_for=0):
+        """Unload least recently used idle models until `room_for` more fit. Caller holds the lock."""
+        for key in list(self._models):
+            if len(self._models) + room_for <= self.max_resident:
+                break
+            if self._models[key].users == 0:
+                print(f"Unloading Whisper model {key}")
+                del self._models[key]
+
+    def resident(self):
+        with self._lock:
+            return list(self._models)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_whisper_pool():
+    """Return the process-wide Whisper model pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WhisperModelPool()
+        return _pool
+
+
+def transcribe_with_whisper(audio_path, size=DEFAULT_MODEL_SIZE, language="en", vad_filter=True):
+    """Transcribe locally and return {"text", "start", "end"} segments with HH:MM:SS.mmm timestamps.
+
+    Same shape as the Gemini transcript, so downstream stages don't care which
+    backend produced it. Voice-activity filtering skips silence before decoding.
+    """
+    from timeparse import format_timestamp
+
+    with get_whisper_pool().model(size) as model:
+        segments, _ = model.transcribe(
+            audio=audio_path,
+            beam_size=5,
+            language=language,
+            vad_filter=vad_filter,
+            condition_on_previous_text=False,
+        )
+        return [
+            {"text": segment.text.strip(), "start": format_timestamp(segment.start), "end": format_timestamp(segment.end)}
+            for segment in segments
+        ]
@@ -0,0 +1,316 @@
+"""Per-job scratch space for intermediate media.
+
+Every pipeline run gets a workspace: a directory on the scratch volume
+(SHORTIFY_SCRATCH_DIR) plus, for small items such as extracted audio, one on
+a RAM-backed volume (SHORTIFY_SMALL_SCRATCH_DIR, /dev/shm when there is one).
+Audio, rendered shorts and ffmpeg intermediates are written there instead of
+loose in /tmp. A run that fails or is cancelled has its workspace deleted
+straight away. A finished run's workspace is kept until the scratch space
+outgrows SHORTIFY_SCRATCH_QUOTA_BYTES, then the least recently used finished
+workspaces are evicted first. Workspaces still in use, by this process or
+another one sharing the volume, are never evicted.
+
+Like the cancel token, the current workspace travels in a context variable,
+so anything run through `contextvars.copy_context().run` (stage workers, the
+fast-cut pool) writes into it. Render worker processes are handed the
+directory explicitly.
+"""
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+SCRATCH_DIR = os.getenv("SHORTIFY_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "shortify-work"))
+SCRATCH_QUOTA_BYTES = int(os.getenv("SHORTIFY_SCRATCH_QUOTA_BYTES", str(20 * 1024 ** 3)))
+# Small items go to RAM-backed scratch while it holds less than this
+SMALL_SCRATCH_DIR = os.getenv(
+    "SHORTIFY_SMALL_SCRATCH_DIR",
+    os.path.join("/dev/shm", "shortify-work") if os.path.isdir("/dev/shm") else "",
+)
+SMALL_SCRATCH_MAX_BYTES = int(os.getenv("SHORTIFY_SMALL_SCRATCH_MAX_BYTES", str(512 * 1024 ** 2)))
+
+# A workspace holds one marker per process using it, named after the pid
+ACTIVE_PREFIX = ".active-"
+INCOMING_DIR = ".incoming"
+
+_current = contextvars.ContextVar("shortify_workspace", default=None)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Workspace:
+    """Scratch directories belonging to one job."""
+
+    def __init__(self, manager, name):
+        self.manager = manager
+        self.name = name
+        self.dir = os.path.join(manager.root, name)
+        self.small_dir = os.path.join(manager.small_root, name) if manager.small_root else None
+
+    def directory(self, small=False):
+        """The workspace directory; for small items the RAM-backed one while it has room."""
+        directory = self.dir
+        if small and self.small_dir and self.manager.small_has_room():
+            directory = self.small_dir
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def path(self, suffix="", small=False):
+        """A new, empty file path in the workspace."""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory(small))
+        os.close(fd)
+        return path
+
+    def size(self):
+        return _dir_size(self.dir) + (_dir_size(self.small_dir) if self.small_dir else 0)
+
+    def remove(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.remove_small()
+
+    def remove_small(self):
+        if self.small_dir:
+            shutil.rmtree(self.small_dir, ignore_errors=True)
+
+
+class WorkspaceManager:
+    def __init__(self, root=SCRATCH_DIR, small_root=SMALL_SCRATCH_DIR, quota_bytes=SCRATCH_QUOTA_BYTES,
+                 small_max_bytes=SMALL_SCRATCH_MAX_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.small_max_bytes = small_max_bytes
+        self.small_root = None
+        if small_root:
+            try:
+                os.makedirs(small_root, exist_ok=True)
+                self.small_root = small_root
+            except OSError as e:
+                print(f"RAM scratch unavailable, using {root} for everything: {e}")
+        self._lock = threading.Lock()
+        self._users = {}
+        os.makedirs(os.path.join(root, INCOMING_DIR), exist_ok=True)
+
+    def _active_path(self, name, pid=None):
+        return os.path.join(self.root, name, f"{ACTIVE_PREFIX}{pid or os.getpid()}")
+
+    def _write_active(self, name):
+        path = self._active_path(name)
+        if self._users.get(name):
+            open(path, "w").close()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _in_use(self, name):
+        if self._users.get(name):
+            return True
+        try:
+            markers = [entry.name for entry in os.scandir(os.path.join(self.root, name))
+                       if entry.name.startswith(ACTIVE_PREFIX)]
+        except OSError:
+            return False
+        # A crashed process leaves its marker behind, only live ones count
+        pids = [int(marker[len(ACTIVE_PREFIX):]) for marker in markers if marker[len(ACTIVE_PREFIX):].isdigit()]
+        return any(pid != os.getpid() and _pid_alive(pid) for pid in pids)
+
+    def acquire(self, name):
+        """Open workspace `name` (creating it) and pin it against eviction until `release`."""
+        with self._lock:
+            os.makedirs(os.path.join(self.root, name), exist_ok=True)
+            self._users[name] = self._users.get(name, 0) + 1
+            self._write_active(name)
+        return Workspace(self, name)
+
+    def release(self, name, failed=False):
+        """Unpin a workspace. A failed one is deleted at once, a finished one becomes evictable.
+
+        Either way its RAM-backed directory goes once nothing uses the workspace,
+        so it doesn't hold memory until eviction gets to it.
+        """
+        with self._lock:
+            self._users[name] = self._users.get(name, 1) - 1
+            if self._users[name] <= 0:
+                del self._users[name]
+            self._write_active(name)
+            workspace = Workspace(self, name)
+            in_use = self._in_use(name)
+            if failed and not in_use:
+                workspace.remove()
+            else:
+                if not in_use:
+                    workspace.remove_small()
+                # Directory mtime is the LRU clock, as in media_cache
+                self._touch(name)
+        self.enforce_quota()
+
+    @contextmanager
+    def workspace(self, name, hold=()):
+        """Use workspace `name` for the duration of the block, also pinning the workspaces owning `hold` paths.
+
+        The workspace is removed if the block raises.
+        """
+        held = [owner for owner in map(self.owner, hold) if owner and owner != name]
+        for owner in held:
+            self.acquire(owner)
+        workspace = self.acquire(name)
+        failed = True
+        try:
+            yield workspace
+            failed = False
+        finally:
+            self.release(name, failed=failed)
+            for owner in held:
+                self.release(owner)
+
+    def owner(self, path):
+        """Name of the workspace `path` lies in, or None."""
+        if not path:
+            return None
+        path = os.path.realpath(path)
+        for root in filter(None, (self.root, self.small_root)):
+            root = os.path.realpath(root)
+            if os.path.commonpath([path, root]) == root and path != root:
+                name = os.path.relpath(path, root).split(os.sep)[0]
+                return None if name.startswith(".") else name
+        return None
+
+    def _touch(self, name):
+        try:
+            os.utime(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    @contextmanager
+    def incoming(self, suffix=""):
+        """A temp file on the scratch volume for data whose name isn't known yet; removed unless moved away."""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=os.path.join(self.root, INCOMING_DIR))
+        os.close(fd)
+        try:
+            with open(path, "wb") as f:
+                yield f
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def store_upload(self, tmp_file, digest, suffix, pin=False):
+        """Close a fully written `incoming` file and move it into its own evictable workspace; returns its path.
+
+        Identical uploads share one file. With `pin` the workspace stays
+        pinned until the caller releases it (`release(owner(path))`), e.g.
+        once a job has taken its own pin.
+        """
+        tmp_file.close()
+        name = f"upload-{digest}"
+        workspace = self.acquire(name)
+        try:
+            path = os.path.join(workspace.dir, f"video{suffix}")
+            if not os.path.exists(path):
+                os.replace(tmp_file.name, path)
+        except BaseException:
+            self.release(name)
+            raise
+        if not pin:
+            self.release(name)
+        return path
+
+    def small_has_room(self):
+        return self.small_root is not None and _dir_size(self.small_root) < self.small_max_bytes
+
+    def enforce_quota(self):
+        """Evict finished workspaces, least recently used first, until scratch fits the quota."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if not entry.is_dir() or entry.name.startswith("."):
+                    continue
+                workspace = Workspace(self, entry.name)
+                size = workspace.size()
+                total += size
+                if not self._in_use(entry.name):
+                    entries.append((entry.stat().st_mtime, size, workspace))
+            entries.sort(key=lambda e: e[0])
+            for _, size, workspace in entries:
+                if total <= self.quota_bytes:
+                    break
+                workspace.remove()
+                total -= size
+                print(f"Evicted scratch workspace {workspace.name}")
+            self._remove_orphans()
+        return total
+
+    def _remove_orphans(self):
+        """RAM-scratch directories whose workspace is gone, and stale partial uploads."""
+        if self.small_root:
+            for entry in os.scandir(self.small_root):
+                if entry.is_dir() and not os.path.isdir(os.path.join(self.root, entry.name)):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        cutoff = time.time() - 24 * 3600
+        for entry in os.scandir(os.path.join(self.root, INCOMING_DIR)):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def workspace_scope(workspace):
+    """Make `workspace` current for the duration of the block."""
+    reset = _current.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current.reset(reset)
+
+
+def current_workspace():
+    return _current.get()
+
+
+def scratch_dir(small=False):
+    """Directory for intermediates of the current job, or None for the system temp dir."""
+    workspace = current_workspace()
+    return workspace.directory(small) if workspace is not None else None
+
+
+def scratch_path(suffix="", small=False):
+    """A new file path in the current workspace, or a plain temp file outside of a job."""
+    workspace = current_workspace()
+    if workspace is not None:
+        return workspace.path(suffix, small=small)
+    return tempfile.NamedTemporaryFile(delete=False, suffix=suffix).name
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager():
+    """Return the process-wide workspace manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+        return _manager